@@ -1,11 +1,107 @@
-import os
-from pathlib import Path
-
-# Model paths
-sentiment_model_path = "/Users/rasha/..."
-translation_model_path = "/Users/rasha/A.."
-image_model_path = "/Users/rasha/A.."
-
-# API Keys
-OPENAI_API_KEY = ""
-GEMINI_API_KEY = ""
\ No newline at end of file
+import os
+from pathlib import Path
+
+# Model paths
+sentiment_model_path = "/Users/rasha/..."
+translation_model_path = "/Users/rasha/A.."
+image_model_path = "/Users/rasha/A.."
+
+# API Keys
+OPENAI_API_KEY = ""
+GEMINI_API_KEY = ""
+
+# Speculative execution: start likely tool work for attached files during tool selection
+SPECULATIVE_EXECUTION = True
+SPECULATIVE_MAX_WORKERS = 2
+
+# Conversation history sidebar
+HISTORY_PAGE_SIZE = 5
+HISTORY_CACHE_SIZE = 200  # prepared history entries kept in memory, shared by all sessions
+
+# Log rotation and retention (0 disables a limit)
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_ROTATE_INTERVAL_HOURS = 24
+LOG_BACKUP_COUNT = 14
+CSV_MAX_BYTES = 50 * 1024 * 1024
+CSV_ROTATE_INTERVAL_HOURS = 24 * 7
+ARCHIVE_RETENTION_DAYS = 365
+
+# Tool registry: manifests that declare the tools (a tool's module is only imported
+# on its first call), and worker threads per cost class
+TOOL_MODULES = [
+    'tools.manifest'
+]
+TOOL_POOL_SIZES = {
+    'local_cpu': 2,
+    'remote_api': 8
+}
+
+# Inference worker pool: run the local models in separate processes
+USE_INFERENCE_POOL = True
+INFERENCE_WORKERS = 2
+INFERENCE_THREADS_PER_WORKER = 0  # 0 splits the CPU cores evenly across workers
+INFERENCE_PRELOAD = [
+    'tools.sentiment_tool:load_sentiment_pipeline',
+    'tools.multimodal_tool:load_translator',
+    'tools.multimodal_tool:load_image_classifier'
+]
+
+# Prefer memory-mapped safetensors weights when loading local models
+MMAP_MODEL_WEIGHTS = True
+
+# Image preparation: resized variants of uploaded images per consumer
+IMAGE_VARIANTS = {
+    'classifier': {'min_side': 256},
+    'gemini': {'max_side': 768, 'format': 'JPEG', 'quality': 90}
+}
+IMAGE_CACHE_SIZE = 32
+IMAGE_BASE_CACHE_SIZE = 4  # decoded originals, which can be large
+
+# Token accounting and budgets (0 disables a budget)
+SESSION_TOKEN_BUDGET = 200_000
+DAILY_TOKEN_BUDGET = 2_000_000
+BUDGET_COMPACT_RATIO = 0.8  # compact prompts once this share of a budget is used
+USAGE_MAX_SESSIONS = 10_000  # session totals kept in memory; the least recently active are dropped first
+MAX_TOOL_RESULT_CHARS = 4000  # per tool result in the summarizer prompt when compacting
+TOKEN_PRICES_PER_MILLION = {  # USD per 1M (prompt, completion) tokens
+    'gpt-4o': (2.50, 10.00),
+    'gemini-1.5-flash': (0.075, 0.30)
+}
+CACHED_PROMPT_PRICE_RATIO = 0.5  # prompt tokens served from the provider's prefix cache cost this share
+
+# Size limits (characters of JSON per tool result) for each consumer of tool results
+TOOL_RESULT_LIMITS = {
+    'prompt': 12000,
+    'log': 20000,
+    'ui': 2000
+}
+
+# Failover between Gemini models and local tools
+GEMINI_MODEL_ID = "gemini-1.5-flash"
+GEMINI_FALLBACK_MODELS = ["gemini-1.5-flash-8b"]  # tried in order when the primary model fails
+GEMINI_UPLOAD_TTL_HOURS = 46  # Gemini deletes uploaded files after 48 hours
+LOCAL_FALLBACK = True  # answer with the local models when every Gemini model fails and they can
+CIRCUIT_FAILURE_THRESHOLD = 3  # consecutive failures before a backend is skipped
+CIRCUIT_RESET_SECONDS = 30  # how long a failing backend is skipped before it is probed again
+HEDGE_REQUESTS = True  # also ask the next backend when a request is slower than its p95
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20  # latencies needed before hedging kicks in
+FAILOVER_LATENCY_WINDOW = 200  # recent latencies kept per backend
+
+# Document sentiment: long text is scored in overlapping token windows
+SENTIMENT_WINDOW_TOKENS = 510  # capped at what the model accepts
+SENTIMENT_WINDOW_OVERLAP = 64
+SENTIMENT_BATCH_SIZE = 8
+SENTIMENT_NEUTRAL_BAND = 0.25  # document scores within +/- this are Neutral
+
+# Content sniffing and early rejection of uploads
+SNIFF_BYTES = 4096  # bytes read from the start of a file to detect its type
+CONTENT_CACHE_SIZE = 512
+PDF_SCAN_BYTES = 1024 * 1024  # bytes read from each end of a PDF to find its page count
+MAX_UPLOAD_BYTES = 2 * 1024 ** 3  # Gemini File API limit per file
+CONTENT_LIMITS = {  # by MIME type or category
+    'application/pdf': {'max_pages': 1000},
+    'audio': {'max_seconds': 9.5 * 3600},
+    'video': {'max_seconds': 3600}
+}
+GEMINI_TOKEN_RATES = {'image': 258, 'page': 258, 'video_second': 263, 'audio_second': 32}
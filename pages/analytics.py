@@ -0,0 +1,68 @@
+import pandas as pd
+import streamlit as st
+from datetime import datetime, timedelta
+from utils.analytics import load_conversations, compute_report
+from utils.speculation import speculative_executor
+from utils.usage import usage_tracker
+
+@st.cache_data(ttl=60, show_spinner="Loading conversation log...")
+def get_report(start, end):
+    """Compute the report at most once a minute per date range"""
+    return compute_report(load_conversations(start=start, end=end))
+
+def main():
+    st.set_page_config(page_title="Analytics", page_icon="📊", layout="wide")
+    st.title("📊 Tool Usage & Latency")
+
+    today = datetime.now().date()
+    date_range = st.date_input("Date range", value=(today - timedelta(days=30), today))
+    start = datetime.combine(date_range[0], datetime.min.time()) if len(date_range) > 0 else None
+    end = datetime.combine(date_range[-1], datetime.min.time()) + timedelta(days=1) if len(date_range) > 0 else None
+
+    report = get_report(start, end)
+    overview = report['overview'].iloc[0]
+    if not overview['queries']:
+        st.info("No conversations recorded in this range")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Queries", int(overview['queries']))
+    col2.metric("Tool calls", int(overview['tool_calls']))
+    col3.metric("Tool error rate", f"{overview['error_rate']:.1%}")
+    col4.metric("p95 latency", f"{overview['latency_p95_ms']:.0f} ms")
+
+    st.markdown("### 🛠️ Tool Usage")
+    st.bar_chart(report['tool_usage']['calls'])
+    st.dataframe(report['tool_usage'])
+
+    if 'tool_latency_ms' in report:
+        st.markdown("### ⏱️ Tool Latency (ms)")
+        st.dataframe(report['tool_latency_ms'])
+
+    if 'daily' in report:
+        st.markdown("### 📅 Daily Queries")
+        st.line_chart(report['daily'])
+
+    # Counters of this server process since it started, not of the date range
+    speculation = speculative_executor.stats()
+    st.markdown("### 🔮 Speculative Execution (since server start)")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Tasks started", int(speculation['started']))
+    col2.metric("Hit rate", f"{speculation['hit_rate']:.1%}")
+    col3.metric("Discarded / cancelled", f"{int(speculation['misses'])} / {int(speculation['cancelled'])}")
+    col4.metric("Wasted work", f"{speculation['wasted_seconds']:.1f} s")
+
+    cache_stats = usage_tracker.prefix_cache_stats()
+    if cache_stats:
+        st.markdown("### 🧠 Prompt Prefix Cache (since server start)")
+        st.dataframe(pd.DataFrame.from_dict(cache_stats, orient='index').rename_axis('stage'))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### 📁 File Types")
+        st.dataframe(report['file_types'])
+    with col2:
+        st.markdown("### 📏 Response Size (chars)")
+        st.dataframe(report['response_chars'])
+
+main()
@@ -0,0 +1,168 @@
+# test_failover.py
+import threading
+import time
+import unittest
+from unittest import mock
+from utils.failover import FailoverRouter, Backend, BackendError, CLOSED, OPEN, HALF_OPEN
+
+class FakeBackend:
+    """Backend callable that answers, raises or sleeps as told, and counts its calls"""
+
+    def __init__(self, name: str, answer: str = None, error: Exception = None, delay: float = 0.0):
+        self.name = name
+        self.answer = answer or f"answer from {name}"
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, file_path):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.answer
+
+    def backend(self, supports=None) -> Backend:
+        if supports is None:
+            return Backend(self.name, self)
+        return Backend(self.name, self, supports)
+
+def make_router(*fakes: FakeBackend, hedge: bool = False, failure_threshold: int = 3, reset_seconds: float = 60) -> FailoverRouter:
+    router = FailoverRouter("test", [fake.backend() for fake in fakes], hedge=hedge)
+    for health in router.health.values():
+        health.failure_threshold = failure_threshold
+        health.reset_seconds = reset_seconds
+    return router
+
+class FailoverOrderTest(unittest.TestCase):
+    def test_primary_answers_first(self):
+        primary, secondary = FakeBackend("primary"), FakeBackend("secondary")
+        router = make_router(primary, secondary)
+        self.assertEqual(router.call("hi"), "answer from primary")
+        self.assertEqual(secondary.calls, 0)
+
+    def test_backend_failure_fails_over_in_order(self):
+        primary = FakeBackend("primary", error=BackendError("503"))
+        secondary = FakeBackend("secondary", error=ConnectionError("reset"))
+        tertiary = FakeBackend("tertiary")
+        router = make_router(primary, secondary, tertiary)
+        self.assertEqual(router.call("hi"), "answer from tertiary")
+        self.assertEqual((primary.calls, secondary.calls, tertiary.calls), (1, 1, 1))
+        self.assertEqual(router.health["primary"].failures, 1)
+        self.assertEqual(router.health["tertiary"].successes, 1)
+
+    def test_unsupported_backends_are_skipped(self):
+        primary, secondary = FakeBackend("primary"), FakeBackend("secondary")
+        router = FailoverRouter("test", [
+            primary.backend(lambda prompt, content_type: content_type == 'text/plain'),
+            secondary.backend()
+        ], hedge=False)
+        self.assertEqual(router.call("hi", content_type='video/mp4'), "answer from secondary")
+        self.assertEqual(primary.calls, 0)
+
+    def test_all_failed_returns_last_error(self):
+        router = make_router(FakeBackend("primary", error=BackendError("down")), FakeBackend("secondary", error=TimeoutError("slow")))
+        self.assertEqual(router.call("hi"), "Error in secondary: slow")
+
+    def test_request_errors_do_not_fail_over_or_count(self):
+        primary, secondary = FakeBackend("primary", error=TypeError("bad argument")), FakeBackend("secondary")
+        router = make_router(primary, secondary, failure_threshold=1)
+        for _ in range(5):
+            self.assertEqual(router.call("hi"), "Error in primary: bad argument")
+        self.assertEqual(secondary.calls, 0)
+        self.assertEqual(router.health["primary"].state, CLOSED)
+        self.assertEqual(router.health["primary"].failures, 0)
+
+    def test_error_strings_are_answers(self):
+        primary, secondary = FakeBackend("primary", answer="Error codes in this log are harmless"), FakeBackend("secondary")
+        router = make_router(primary, secondary, failure_threshold=1)
+        self.assertEqual(router.call("hi"), "Error codes in this log are harmless")
+        self.assertEqual(router.health["primary"].state, CLOSED)
+        self.assertEqual(secondary.calls, 0)
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_threshold_and_skips_backend(self):
+        primary, secondary = FakeBackend("primary", error=BackendError("down")), FakeBackend("secondary")
+        router = make_router(primary, secondary, failure_threshold=3)
+        for _ in range(3):
+            router.call("hi")
+        self.assertEqual(router.health["primary"].state, OPEN)
+        self.assertEqual(router.call("hi"), "answer from secondary")
+        self.assertEqual(primary.calls, 3)
+
+    def test_half_open_probe_closes_on_success(self):
+        primary, secondary = FakeBackend("primary", error=BackendError("down")), FakeBackend("secondary")
+        router = make_router(primary, secondary, failure_threshold=1, reset_seconds=0.05)
+        router.call("hi")
+        self.assertEqual(router.health["primary"].state, OPEN)
+
+        time.sleep(0.06)
+        primary.error = None
+        self.assertEqual(router.call("hi"), "answer from primary")
+        self.assertEqual(router.health["primary"].state, CLOSED)
+
+    def test_half_open_probe_reopens_on_failure(self):
+        primary, secondary = FakeBackend("primary", error=BackendError("down")), FakeBackend("secondary")
+        router = make_router(primary, secondary, failure_threshold=1, reset_seconds=0.05)
+        router.call("hi")
+        time.sleep(0.06)
+        self.assertEqual(router.call("hi"), "answer from secondary")
+        self.assertEqual(primary.calls, 2)
+        self.assertEqual(router.health["primary"].state, OPEN)
+
+    def test_half_open_allows_one_probe_at_a_time(self):
+        router = make_router(FakeBackend("primary"), failure_threshold=1, reset_seconds=0.05)
+        health = router.health["primary"]
+        health.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(health.allow())
+        self.assertEqual(health.state, HALF_OPEN)
+        self.assertFalse(health.allow())
+
+    def test_request_error_frees_half_open_probe(self):
+        primary = FakeBackend("primary", error=BackendError("down"))
+        router = make_router(primary, failure_threshold=1, reset_seconds=0.05)
+        router.call("hi")
+        time.sleep(0.06)
+        primary.error = ValueError("unreadable file")
+        self.assertEqual(router.call("hi"), "Error in primary: unreadable file")
+        primary.error = None
+        self.assertEqual(router.call("hi"), "answer from primary")
+        self.assertEqual(router.health["primary"].state, CLOSED)
+
+class HedgingTest(unittest.TestCase):
+    def test_hedge_fires_after_p95(self):
+        primary, secondary = FakeBackend("primary"), FakeBackend("secondary")
+        router = make_router(primary, secondary, hedge=True)
+        for _ in range(20):
+            router.health["primary"].record_success(0.02)
+
+        primary.delay = 1.0
+        with mock.patch("utils.failover.HEDGE_MIN_SAMPLES", 20):
+            started = time.perf_counter()
+            self.assertEqual(router.call("hi"), "answer from secondary")
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(secondary.calls, 1)
+
+    def test_no_hedge_without_enough_samples(self):
+        primary, secondary = FakeBackend("primary", delay=0.1), FakeBackend("secondary")
+        router = make_router(primary, secondary, hedge=True)
+        with mock.patch("utils.failover.HEDGE_MIN_SAMPLES", 20):
+            self.assertEqual(router.call("hi"), "answer from primary")
+        self.assertEqual(secondary.calls, 0)
+
+    def test_hedge_disabled_per_request(self):
+        primary, secondary = FakeBackend("primary"), FakeBackend("secondary")
+        router = make_router(primary, secondary, hedge=True)
+        for _ in range(20):
+            router.health["primary"].record_success(0.01)
+
+        primary.delay = 0.2
+        with mock.patch("utils.failover.HEDGE_MIN_SAMPLES", 20):
+            self.assertEqual(router.call("hi", hedge=False), "answer from primary")
+        self.assertEqual(secondary.calls, 0)
+
+if __name__ == '__main__':
+    unittest.main()
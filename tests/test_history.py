@@ -0,0 +1,109 @@
+# test_history.py
+import csv
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from utils.history import ConversationHistory
+from utils.logger import CSV_HEADERS, gzip_file
+
+class HistoryPagingTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.logger = SimpleNamespace(
+            csv_path=os.path.join(self.directory, 'conversation.csv'),
+            archive_dir=os.path.join(self.directory, 'archive'),
+            logger=logging.getLogger('test_history')
+        )
+        os.makedirs(self.logger.archive_dir)
+        self.written = 0
+        self.segments = 0
+        self.start_live()
+
+    def start_live(self):
+        with open(self.logger.csv_path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerow(CSV_HEADERS)
+
+    def log(self, count: int):
+        with open(self.logger.csv_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
+            for _ in range(count):
+                writer.writerow({'timestamp': '2026-10-01T12:00:00', 'user_query': f"query {self.written}",
+                                 'tool_name': 'sentiment_tool'})
+                self.written += 1
+
+    def rotate(self) -> str:
+        """Archive the live log the way EnhancedLogger does and start a new one"""
+        segment = os.path.join(self.logger.archive_dir, f"conversation_20261001_1200{self.segments:02d}_000000.csv")
+        self.segments += 1
+        os.replace(self.logger.csv_path, segment)
+        self.start_live()
+        gzip_file(segment, segment + '.gz')
+        return segment + '.gz'
+
+    def all_queries(self, history: ConversationHistory, limit: int = 4):
+        queries, cursor = [], None
+        while True:
+            entries, cursor = history.page(before=cursor, limit=limit)
+            queries += [entry['user_query'] for entry in entries]
+            if cursor is None:
+                return queries
+
+    def test_pages_across_rotations(self):
+        history = ConversationHistory(logger=self.logger)
+        self.log(5)
+        self.rotate()
+        self.log(6)
+        self.rotate()
+        self.log(3)
+        history.refresh()
+        expected = [f"query {i}" for i in reversed(range(14))]
+        self.assertEqual(self.all_queries(history), expected)
+
+    def test_rotation_between_refreshes(self):
+        history = ConversationHistory(logger=self.logger)
+        self.log(3)
+        history.refresh()
+        generation = history.generation
+        self.rotate()
+        self.log(2)
+        history.refresh()
+        self.assertGreater(history.generation, generation)
+        self.assertEqual(self.all_queries(history, limit=2), [f"query {i}" for i in reversed(range(5))])
+
+    def test_bad_segment_is_skipped(self):
+        history = ConversationHistory(logger=self.logger)
+        self.log(4)
+        self.rotate()
+        self.log(4)
+        truncated = self.rotate()
+        self.log(4)
+        with open(truncated, 'rb') as f:
+            data = f.read()
+        with open(truncated, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        history.refresh()
+
+        with self.assertLogs('test_history', level='ERROR'):
+            queries = self.all_queries(history)
+        self.assertEqual(queries, [f"query {i}" for i in [11, 10, 9, 8, 3, 2, 1, 0]])
+
+    def test_corrupt_segment_is_skipped(self):
+        history = ConversationHistory(logger=self.logger)
+        self.log(2)
+        corrupt = self.rotate()
+        self.log(2)
+        with open(corrupt, 'r+b') as f:
+            # Past the header, into the deflate stream
+            f.seek(os.path.getsize(corrupt) // 2)
+            f.write(b'\xff' * 16)
+        history.refresh()
+
+        with self.assertLogs('test_history', level='ERROR'):
+            self.assertEqual(self.all_queries(history), ["query 3", "query 2"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# test_model_loader.py
+import os
+import tempfile
+import unittest
+import torch
+from transformers import M2M100Config, M2M100ForConditionalGeneration
+from utils import model_loader
+
+def tiny_translator(path: str):
+    """Save a tiny random M2M100 model with non-default generation settings to path"""
+    torch.manual_seed(0)
+    config = M2M100Config(vocab_size=64, d_model=16, encoder_layers=1, decoder_layers=1,
+                          encoder_attention_heads=2, decoder_attention_heads=2,
+                          encoder_ffn_dim=32, decoder_ffn_dim=32, max_position_embeddings=64)
+    model = M2M100ForConditionalGeneration(config)
+    model.generation_config.max_length = 40
+    model.generation_config.num_beams = 2
+    model.generation_config.decoder_start_token_id = 2
+    model.save_pretrained(path, safe_serialization=True)
+
+class LoadPretrainedTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        tiny_translator(self.directory.name)
+        model_loader._loaded.clear()
+
+    def test_mapped_matches_from_pretrained(self):
+        mapped = model_loader.load_pretrained(M2M100ForConditionalGeneration, self.directory.name, name="mapped")
+        self.assertTrue(model_loader._loaded["mapped"]['mapped'])
+        copied = M2M100ForConditionalGeneration.from_pretrained(self.directory.name).eval()
+
+        self.assertEqual(mapped.config.to_dict(), copied.config.to_dict())
+        self.assertEqual(mapped.generation_config.to_dict(), copied.generation_config.to_dict())
+        self.assertEqual(mapped.generation_config.max_length, 40)
+
+        input_ids = torch.tensor([[5, 6, 7, 8, 2]])
+        with torch.no_grad():
+            self.assertTrue(torch.equal(mapped(input_ids=input_ids, decoder_input_ids=input_ids).logits,
+                                        copied(input_ids=input_ids, decoder_input_ids=input_ids).logits))
+            self.assertTrue(torch.equal(mapped.generate(input_ids=input_ids), copied.generate(input_ids=input_ids)))
+
+    def test_missing_generation_config_keeps_defaults(self):
+        os.remove(os.path.join(self.directory.name, 'generation_config.json'))
+        mapped = model_loader.load_pretrained(M2M100ForConditionalGeneration, self.directory.name, name="mapped")
+        self.assertTrue(model_loader._loaded["mapped"]['mapped'])
+        self.assertNotEqual(mapped.generation_config.max_length, 40)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,211 +1,413 @@
-import google.generativeai as genai
-import PIL.Image
-import time
-import mimetypes
-from pathlib import Path
-from typing import Any, Dict, List, Union, Optional
-from dataclasses import dataclass
-from config.config import GEMINI_API_KEY
-
-@dataclass
-class ContentTool:
-    name: str
-    description: str
-    supported_types: List[str]
-    process_func: callable
-
-class UnifiedGeminiAgent:
-    """
-    A unified agent that automatically handles different types of content through tools.
-    """
-    
-    def __init__(self, model_id: str = "gemini-1.5-flash"):
-        """Initialize the agent with API key and tools."""
-        self.model_id = model_id
-        genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(self.model_id)
-        
-        # Initialize tools
-        self._initialize_tools()
-        
-        # Initialize chat for interactive sessions
-        self.chat = self.model.start_chat()
-
-    def _initialize_tools(self):
-        """Initialize content processing tools."""
-        self.tools = {
-            'text': ContentTool(
-                name="text_processor",
-                description="Process text-only content",
-                supported_types=['text/plain'],
-                process_func=self._process_text
-            ),
-            'image': ContentTool(
-                name="image_processor",
-                description="Process image content",
-                supported_types=['image/jpeg', 'image/png', 'image/gif'],
-                process_func=self._process_image
-            ),
-            'audio': ContentTool(
-                name="audio_processor",
-                description="Process audio content",
-                supported_types=['audio/mpeg', 'audio/wav', 'audio/x-wav'],
-                process_func=self._process_audio
-            ),
-            'video': ContentTool(
-                name="video_processor",
-                description="Process video content",
-                supported_types=['video/mp4', 'video/mpeg', 'video/quicktime'],
-                process_func=self._process_video
-            ),
-            'document': ContentTool(
-                name="document_processor",
-                description="Process document content",
-                supported_types=['application/pdf'],
-                process_func=self._process_document
-            )
-        }
-
-    def _get_content_type(self, file_path: Optional[Union[str, Path]] = None) -> str:
-        """Determine content type from file or assume text if no file provided."""
-        if file_path is None:
-            return 'text/plain'
-        
-        mime_type, _ = mimetypes.guess_type(str(file_path))
-        return mime_type or 'application/octet-stream'
-
-    def _get_appropriate_tool(self, content_type: str) -> Optional[ContentTool]:
-        """Get the appropriate tool for the content type."""
-        for tool in self.tools.values():
-            if content_type in tool.supported_types:
-                return tool
-        return None
-
-    def _process_text(self, prompt: str, **kwargs) -> str:
-        """Process text-only content."""
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text if hasattr(response, 'text') else str(response)
-        except Exception as e:
-            return f"Error processing text: {str(e)}"
-
-    def _process_image(self, prompt: str, file_path: Union[str, Path], **kwargs) -> str:
-        """Process image content."""
-        try:
-            image = PIL.Image.open(file_path)
-            response = self.model.generate_content([prompt, image])
-            return response.text if hasattr(response, 'text') else str(response)
-        except Exception as e:
-            return f"Error processing image: {str(e)}"
-
-    def _process_audio(self, prompt: str, file_path: Union[str, Path], **kwargs) -> str:
-        """Process audio content."""
-        try:
-            audio_file = genai.upload_file(file_path)
-            response = self.model.generate_content([prompt, audio_file])
-            return response.text if hasattr(response, 'text') else str(response)
-        except Exception as e:
-            return f"Error processing audio: {str(e)}"
-
-    def _process_video(self, prompt: str, file_path: Union[str, Path], **kwargs) -> str:
-        """Process video content."""
-        try:
-            video_file = genai.upload_file(file_path)
-            
-            # Wait for video processing
-            while video_file.state.name == "PROCESSING":
-                print("Processing video...")
-                time.sleep(5)
-                video_file = genai.get_file(video_file.name)
-            
-            response = self.model.generate_content([prompt, video_file])
-            return response.text if hasattr(response, 'text') else str(response)
-        except Exception as e:
-            return f"Error processing video: {str(e)}"
-
-    def _process_document(self, prompt: str, file_path: Union[str, Path], **kwargs) -> str:
-        """Process document content."""
-        try:
-            doc_file = genai.upload_file(file_path)
-            response = self.model.generate_content([prompt, doc_file])
-            return response.text if hasattr(response, 'text') else str(response)
-        except Exception as e:
-            return f"Error processing document: {str(e)}"
-
-    def process(self, 
-                prompt: str, 
-                file_path: Optional[Union[str, Path]] = None, 
-                **kwargs) -> str:
-        """
-        Main processing method that automatically handles different content types.
-        
-        Args:
-            prompt (str): The prompt or query for the model
-            file_path (Optional[Union[str, Path]]): Path to the file to process (if any)
-            **kwargs: Additional arguments for specific tools
-            
-        Returns:
-            str: Generated response
-            
-        Raises:
-            ValueError: If content type is not supported
-        """
-        try:
-            content_type = self._get_content_type(file_path)
-            tool = self._get_appropriate_tool(content_type)
-            
-            if tool is None:
-                raise ValueError(f"Unsupported content type: {content_type}")
-            
-            # Process the content using the appropriate tool
-            if file_path is None:
-                return tool.process_func(prompt, **kwargs)
-            else:
-                return tool.process_func(prompt, file_path, **kwargs)
-        except Exception as e:
-            return f"Error in process: {str(e)}"
-
-# Create a singleton instance
-gemini_agent = UnifiedGeminiAgent()
-
-# Tool definition for OpenAI function calling
-gemini_tool = {
-    "type": "function",
-    "function": {
-        "name": "process_with_gemini",
-        "description": "Useful for advance question answering Advanced text and sentiment analysis, Advance image and video processing ,Document understanding and extraction, Multi-language translation,Content generation",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "prompt": {
-                    "type": "string",
-                    "description": "The prompt or query to process."
-                },
-                "file_path": {
-                    "type": "string",
-                    "description": "Path to the file to be processed (image, audio, video, or document). if available"
-                },
-                "file_type": {
-                    "type": "string",
-                    "description": "Type of file (text, image, audio, video, document)",
-                    "enum": ["text", "image", "audio", "video", "document"]
-                }
-            },
-            "required": ["prompt"]
-        }
-    }
-}
-
-def process_with_gemini(prompt: str, file_path: str = None, file_type: str = None) -> str:
-    """
-    Process content using Gemini model.
-    
-    Args:
-        prompt (str): The prompt or query to process
-        file_path (str, optional): Path to the file to process
-        file_type (str, optional): Type of file for explicit type declaration
-        
-    Returns:
-        str: Generated response from Gemini
-    """
-    return gemini_agent.process(prompt=prompt, file_path=file_path)
\ No newline at end of file
+import time
+import os
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple, Union, Optional
+from dataclasses import dataclass, field
+from config.config import GEMINI_API_KEY, GEMINI_MODEL_ID, GEMINI_FALLBACK_MODELS, GEMINI_UPLOAD_TTL_HOURS, LOCAL_FALLBACK
+from utils.failover import FailoverRouter, Backend, BackendError
+from utils.inference_pool import run_model
+from utils.image_prep import image_preparer
+from utils.content_type import content_sniffer, estimate_gemini_tokens
+from utils.usage import usage_tracker, usage_scope, BUDGET_EXCEEDED
+from tools.manifest import GEMINI_CONTENT_TYPES
+
+@lru_cache(maxsize=1)
+def _genai():
+    """Import and configure the Gemini client on first use, so importing this module does no remote setup"""
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+@lru_cache(maxsize=1)
+def _api_errors():
+    """(backend failures, request errors among them) as exception types of the Google client libraries"""
+    failures, request_errors = [ConnectionError, TimeoutError], []
+    try:
+        from google.api_core import exceptions as api_exceptions
+        failures.append(api_exceptions.GoogleAPIError)
+        # 4xx means the request was bad, except for quota and credential problems
+        request_errors += [api_exceptions.BadRequest, api_exceptions.NotFound, api_exceptions.Conflict,
+                           api_exceptions.PreconditionFailed, api_exceptions.RequestRangeNotSatisfiable]
+    except ImportError:
+        pass
+    return tuple(failures), tuple(request_errors)
+
+def is_backend_failure(error: Exception) -> bool:
+    """Whether an exception means Gemini failed (transport, API or timeout) rather than the request"""
+    failures, request_errors = _api_errors()
+    return isinstance(error, failures) and not isinstance(error, request_errors)
+
+@dataclass
+class Upload:
+    """A file sent (or being sent) to the Gemini File API"""
+    key: tuple
+    future: Future = field(default_factory=Future)
+    created_at: float = field(default_factory=time.time)
+    used: bool = False  # by a query, so a discarded speculation must not delete it
+
+@dataclass
+class ContentTool:
+    name: str
+    description: str
+    supported_types: List[str]
+    process_func: callable
+
+class UnifiedGeminiAgent:
+    """
+    A unified agent that automatically handles different types of content through tools.
+
+    The Gemini client and model are created on first use, and the chat session
+    only when chat is accessed, so constructing an agent is cheap.
+    """
+    
+    def __init__(self, model_id: str = GEMINI_MODEL_ID):
+        """Initialize the agent with its model ID and tools."""
+        self.model_id = model_id
+        self._model = None
+        self._chat = None
+        self._model_lock = threading.Lock()
+        
+        # Initialize tools
+        self._initialize_tools()
+
+        # Uploads keyed by (path, mtime) so a file is only sent to Gemini once
+        self._uploads: Dict[tuple, Upload] = {}
+        self._uploads_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The GenerativeModel, built on first use."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = _genai().GenerativeModel(self.model_id)
+        return self._model
+
+    @property
+    def chat(self):
+        """Chat session for interactive use, started the first time it is accessed."""
+        if self._chat is None:
+            model = self.model
+            with self._model_lock:
+                if self._chat is None:
+                    self._chat = model.start_chat()
+        return self._chat
+
+    def _initialize_tools(self):
+        """Initialize content processing tools."""
+        self.tools = {
+            'text': ContentTool(
+                name="text_processor",
+                description="Process text-only content",
+                supported_types=GEMINI_CONTENT_TYPES['text'],
+                process_func=self._process_text
+            ),
+            'image': ContentTool(
+                name="image_processor",
+                description="Process image content",
+                supported_types=GEMINI_CONTENT_TYPES['image'],
+                process_func=self._process_image
+            ),
+            'audio': ContentTool(
+                name="audio_processor",
+                description="Process audio content",
+                supported_types=GEMINI_CONTENT_TYPES['audio'],
+                process_func=self._process_audio
+            ),
+            'video': ContentTool(
+                name="video_processor",
+                description="Process video content",
+                supported_types=GEMINI_CONTENT_TYPES['video'],
+                process_func=self._process_video
+            ),
+            'document': ContentTool(
+                name="document_processor",
+                description="Process document content",
+                supported_types=GEMINI_CONTENT_TYPES['document'],
+                process_func=self._process_document
+            )
+        }
+        # Content type -> tool, built once so dispatch is a single lookup
+        self._tools_by_type = {
+            content_type: tool
+            for tool in self.tools.values()
+            for content_type in tool.supported_types
+        }
+
+    def _get_content_type(self, file_path: Optional[Union[str, Path]] = None) -> str:
+        """Determine content type from the file's magic bytes or assume text if no file provided."""
+        return content_sniffer.content_type(file_path)
+
+    def _get_appropriate_tool(self, content_type: str) -> Optional[ContentTool]:
+        """Get the appropriate tool for the content type."""
+        return self._tools_by_type.get(content_type)
+
+    def _send_upload(self, file_path: Union[str, Path]):
+        """Send a file to the Gemini File API."""
+        return _genai().upload_file(file_path)
+
+    def _upload(self, file_path: Union[str, Path], prefetch: bool = False) -> Tuple[Upload, bool]:
+        """
+        The upload of this file version and whether this call created it.
+
+        Only the caller that creates the entry uploads, outside the lock, so uploads
+        of different files run in parallel and callers of the same file wait for it.
+        """
+        key = (str(file_path), os.stat(file_path).st_mtime_ns)
+        with self._uploads_lock:
+            upload = self._uploads.get(key)
+            if upload is not None and time.time() - upload.created_at > GEMINI_UPLOAD_TTL_HOURS * 3600:
+                upload = None
+            created = upload is None
+            if created:
+                upload = self._uploads[key] = Upload(key)
+            if not prefetch:
+                upload.used = True
+
+        if created:
+            try:
+                upload.future.set_result(self._send_upload(file_path))
+            except Exception as e:
+                upload.future.set_exception(e)
+                with self._uploads_lock:
+                    if self._uploads.get(key) is upload:
+                        del self._uploads[key]
+        return upload, created
+
+    def _upload_file(self, file_path: Union[str, Path]):
+        """Upload a file to Gemini, reusing an earlier upload of the same file version."""
+        return self._upload(file_path)[0].future.result()
+
+    def prefetch_upload(self, file_path: Union[str, Path]) -> Optional[Upload]:
+        """Upload a file ahead of time; returns the upload if this call started it."""
+        upload, created = self._upload(file_path, prefetch=True)
+        upload.future.result()
+        return upload if created else None
+
+    def discard_upload(self, upload: Optional[Upload]):
+        """Delete a prefetched upload from Gemini unless a query has used it since."""
+        if upload is None:
+            return
+        with self._uploads_lock:
+            if upload.used or self._uploads.get(upload.key) is not upload:
+                return
+            del self._uploads[upload.key]
+        try:
+            _genai().delete_file(upload.future.result().name)
+        except Exception:
+            pass
+
+    def _request_error(self, action: str, error: Exception) -> str:
+        """Error string for a problem with the request; Gemini's own failures are raised for failover"""
+        if is_backend_failure(error):
+            raise BackendError(f"{self.model_id} failed {action}: {str(error)}") from error
+        return f"Error {action}: {str(error)}"
+
+    def _generate(self, stage: str, contents):
+        """Call generate_content and record its token usage under stage."""
+        response = self.model.generate_content(contents)
+        usage_tracker.record_gemini(stage, self.model_id, response)
+        return response
+
+    def _process_text(self, prompt: str, file_path: Optional[Union[str, Path]] = None, **kwargs) -> str:
+        """Process text-only content, with the contents of a text file if one is given."""
+        try:
+            contents = prompt
+            if file_path is not None:
+                with open(file_path, encoding='utf-8', errors='replace') as f:
+                    contents = [prompt, f.read()]
+            response = self._generate("gemini_text", contents)
+            return response.text if hasattr(response, 'text') else str(response)
+        except Exception as e:
+            return self._request_error("processing text", e)
+
+    def _process_image(self, prompt: str, file_path: Union[str, Path], **kwargs) -> str:
+        """Process image content."""
+        try:
+            # Send a downscaled copy: Gemini bills on image size and rarely needs full resolution
+            data, mime_type = image_preparer.prepare_bytes(file_path, 'gemini')
+            response = self._generate("gemini_image", [prompt, {'mime_type': mime_type, 'data': data}])
+            return response.text if hasattr(response, 'text') else str(response)
+        except Exception as e:
+            return self._request_error("processing image", e)
+
+    def _process_audio(self, prompt: str, file_path: Union[str, Path], **kwargs) -> str:
+        """Process audio content."""
+        try:
+            audio_file = self._upload_file(file_path)
+            response = self._generate("gemini_audio", [prompt, audio_file])
+            return response.text if hasattr(response, 'text') else str(response)
+        except Exception as e:
+            return self._request_error("processing audio", e)
+
+    def _process_video(self, prompt: str, file_path: Union[str, Path], **kwargs) -> str:
+        """Process video content."""
+        try:
+            video_file = self._upload_file(file_path)
+            
+            # Wait for video processing
+            while video_file.state.name == "PROCESSING":
+                print("Processing video...")
+                time.sleep(5)
+                video_file = _genai().get_file(video_file.name)
+            
+            response = self._generate("gemini_video", [prompt, video_file])
+            return response.text if hasattr(response, 'text') else str(response)
+        except Exception as e:
+            return self._request_error("processing video", e)
+
+    def _process_document(self, prompt: str, file_path: Union[str, Path], **kwargs) -> str:
+        """Process document content."""
+        try:
+            doc_file = self._upload_file(file_path)
+            response = self._generate("gemini_document", [prompt, doc_file])
+            return response.text if hasattr(response, 'text') else str(response)
+        except Exception as e:
+            return self._request_error("processing document", e)
+
+    def process(self, 
+                prompt: str, 
+                file_path: Optional[Union[str, Path]] = None, 
+                **kwargs) -> str:
+        """
+        Main processing method that automatically handles different content types.
+        
+        Args:
+            prompt (str): The prompt or query for the model
+            file_path (Optional[Union[str, Path]]): Path to the file to process (if any)
+            **kwargs: Additional arguments for specific tools
+            
+        Returns:
+            str: Generated response
+            
+        Raises:
+            BackendError: If Gemini itself failed (transport, API or timeout)
+        """
+        try:
+            content_type = self._get_content_type(file_path)
+            tool = self._get_appropriate_tool(content_type)
+            
+            if tool is None:
+                raise ValueError(f"Unsupported content type: {content_type}")
+            
+            # Process the content using the appropriate tool
+            if file_path is None:
+                return tool.process_func(prompt, **kwargs)
+            else:
+                return tool.process_func(prompt, file_path, **kwargs)
+        except BackendError:
+            raise
+        except Exception as e:
+            return self._request_error("in process", e)
+
+# One agent per model ID, shared by every caller of that model
+_agents: Dict[str, UnifiedGeminiAgent] = {}
+_agents_lock = threading.Lock()
+
+def get_gemini_agent(model_id: str = GEMINI_MODEL_ID) -> UnifiedGeminiAgent:
+    """The shared agent for model_id, created on first request"""
+    with _agents_lock:
+        agent = _agents.get(model_id)
+        if agent is None:
+            agent = _agents[model_id] = UnifiedGeminiAgent(model_id)
+        return agent
+
+def register_gemini_agent(agent: UnifiedGeminiAgent):
+    """Put agent in the pool for its model ID, e.g. a stand-in backend for load tests"""
+    with _agents_lock:
+        _agents[agent.model_id] = agent
+
+# Create a singleton instance (cheap: the Gemini client is only set up on first use)
+gemini_agent = get_gemini_agent()
+
+def prefetch_image(file_path: str):
+    """Resize an image the way _process_image sends it, ahead of a likely process_with_gemini call"""
+    return image_preparer.prepare_bytes(file_path, 'gemini')
+
+def prefetch_upload(file_path: str):
+    """Upload a file for the default agent ahead of a likely process_with_gemini call"""
+    return get_gemini_agent().prefetch_upload(file_path)
+
+def discard_upload(file_path: str, upload):
+    """Delete an upload made by prefetch_upload that no query used"""
+    get_gemini_agent().discard_upload(upload)
+
+# Prompt keywords for the tasks the local models can stand in for
+SENTIMENT_KEYWORDS = ('sentiment', 'positive', 'negative', 'tone', 'emotion', 'feel')
+TRANSLATION_KEYWORDS = ('translat', 'french')  # the local translator only targets French
+
+def local_fallback_supports(prompt: str, content_type: str) -> bool:
+    """Whether the local models can give a (reduced) answer to this request"""
+    if content_type.startswith('image/'):
+        return True
+    if content_type == 'text/plain':
+        lowered = prompt.lower()
+        return any(keyword in lowered for keyword in SENTIMENT_KEYWORDS + TRANSLATION_KEYWORDS)
+    return False
+
+def process_locally(prompt: str, file_path: str = None) -> str:
+    """Answer with the local classifier, sentiment or translation model when Gemini is unavailable"""
+    from tools.sentiment_tool import analyze_sentiment
+    from tools.multimodal_tool import classify_image
+
+    if file_path and gemini_agent._get_content_type(file_path).startswith('image/'):
+        labels = classify_image(file_path)
+        top = ", ".join(f"{item['label']} ({item['score']:.2f})" for item in labels[:3])
+        return f"Local image classification (Gemini unavailable): {top}"
+
+    text = prompt
+    if file_path:
+        with open(file_path, encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    if any(keyword in prompt.lower() for keyword in TRANSLATION_KEYWORDS):
+        translation = run_model("tools.multimodal_tool:translate_text", text, "en", "fr")
+        return f"Local French translation (Gemini unavailable): {translation}"
+    sentiment = analyze_sentiment(text)
+    return (f"Local sentiment analysis (Gemini unavailable): {sentiment['sentiment_label']} "
+            f"(score {sentiment['sentiment_score']})")
+
+def _gemini_supports(prompt: str, content_type: str) -> bool:
+    return content_type in gemini_agent._tools_by_type
+
+# Primary Gemini model, then the fallback models, then the local models where they can help
+gemini_router = FailoverRouter("gemini", [
+    Backend(GEMINI_MODEL_ID, lambda prompt, file_path: get_gemini_agent(GEMINI_MODEL_ID).process(prompt, file_path), _gemini_supports)
+])
+for fallback_model in GEMINI_FALLBACK_MODELS:
+    gemini_router.add_backend(Backend(
+        fallback_model,
+        lambda prompt, file_path, model_id=fallback_model: get_gemini_agent(model_id).process(prompt, file_path),
+        _gemini_supports
+    ))
+if LOCAL_FALLBACK:
+    gemini_router.add_backend(Backend("local", process_locally, local_fallback_supports))
+
+def process_with_gemini(prompt: str, file_path: str = None, file_type: str = None) -> str:
+    """
+    Process content using Gemini model.
+    
+    Args:
+        prompt (str): The prompt or query to process
+        file_path (str, optional): Path to the file to process
+        file_type (str, optional): Type of file for explicit type declaration
+        
+    Returns:
+        str: Generated response from Gemini, a fallback model or a local model
+    """
+    if file_path:
+        # Reject unsupported, oversized or overlong files before anything is uploaded
+        problem = content_sniffer.check(file_path, gemini_agent._tools_by_type)
+        if problem:
+            return f"Error in process: {problem}"
+        # A long video or document can cost more than what is left of the budget on its own
+        estimate = estimate_gemini_tokens(content_sniffer.detect(file_path))
+        scope = usage_scope.get()
+        if estimate and usage_tracker.budget_state(scope[0] if scope else None, estimate) == BUDGET_EXCEEDED:
+            return f"Error in process: the file would use about {estimate} tokens, more than is left of the token budget"
+    content_type = gemini_agent._get_content_type(file_path)
+    # Hedging duplicates uploads of PDFs, audio and video, so only race the quick text and image calls
+    hedge = content_type == 'text/plain' or content_type.startswith('image/')
+    return gemini_router.call(prompt, file_path, content_type=content_type, hedge=hedge)
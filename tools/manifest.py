@@ -0,0 +1,160 @@
+# manifest.py
+"""
+Declarations of the tools: OpenAI schema, accepted MIME types, cost class,
+concurrency limit and entry point, plus the speculative work for attached files.
+
+Importing this module registers the tools without importing their modules;
+registry.resolve() imports a tool module the first time the tool is called, and
+the speculative tasks import theirs the first time they run.
+"""
+import importlib
+from typing import Callable
+from tools.registry import registry, ToolSpec, LOCAL_CPU, REMOTE_API
+from utils.speculation import speculative_executor, SpeculativeTask
+from config.config import USE_INFERENCE_POOL
+
+def lazy(entry_point: str) -> Callable:
+    """Callable that imports the function at entry_point ("module:function") when called"""
+    module_name, function_name = entry_point.split(':')
+
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module_name), function_name)(*args, **kwargs)
+    return call
+
+# Tool definitions for OpenAI function calling
+sentiment_tool = {
+    "type": "function",
+    "function": {
+        "name": "analyze_sentiment",
+        "description": "Analyze the sentiment of a given text or text document of any length and return the sentiment score and label, with a per-section breakdown for long documents.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "text": {
+                    "type": "string",
+                    "description": "The text to analyze for sentiment. Can be omitted when a text file is attached."
+                }
+            },
+            "required": []
+        }
+    }
+}
+
+multimodal_tool = {
+    "type": "function",
+    "function": {
+        "name": "analyze_multimodal_content",
+        "description": "tool can Analyze text sentiment, image classification, and translate text to target language only",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "text": {
+                    "type": "string",
+                    "description": "The text to analyze for sentiment or translate."
+                },
+                "file_path": {
+                    "type": "string",
+                    "description": "The path to the image file for classification."
+                },
+                "translate_source_lang": {
+                    "type": "string",
+                    "description": "The source language for translation (for ex-'en')",
+                    "default": "en"
+                },
+                "translate_target_lang": {
+                    "type": "string",
+                    "description": "The target language for translation (for ex-'fr')",
+                    "default": "fr"
+                }
+            },
+            "required": []
+        }
+    }
+}
+
+gemini_tool = {
+    "type": "function",
+    "function": {
+        "name": "process_with_gemini",
+        "description": "Useful for advance question answering Advanced text and sentiment analysis, Advance image and video processing ,Document understanding and extraction, Multi-language translation,Content generation",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "prompt": {
+                    "type": "string",
+                    "description": "The prompt or query to process."
+                },
+                "file_path": {
+                    "type": "string",
+                    "description": "Path to the file to be processed (image, audio, video, or document). if available"
+                },
+                "file_type": {
+                    "type": "string",
+                    "description": "Type of file (text, image, audio, video, document)",
+                    "enum": ["text", "image", "audio", "video", "document"]
+                }
+            },
+            "required": ["prompt"]
+        }
+    }
+}
+
+# MIME types of each content tool of UnifiedGeminiAgent, which builds its tools from this table
+GEMINI_CONTENT_TYPES = {
+    'text': ['text/plain'],
+    'image': ['image/jpeg', 'image/png', 'image/gif'],
+    'audio': ['audio/mpeg', 'audio/wav', 'audio/x-wav'],
+    'video': ['video/mp4', 'video/mpeg', 'video/quicktime'],
+    'document': ['application/pdf']
+}
+GEMINI_MIME_TYPES = [mime_type for mime_types in GEMINI_CONTENT_TYPES.values() for mime_type in mime_types]
+
+registry.register(ToolSpec(
+    name="analyze_sentiment",
+    schema=sentiment_tool,
+    entry_point="tools.sentiment_tool:analyze_sentiment",
+    mime_types=['text/plain'],
+    cost_class=LOCAL_CPU,
+    max_concurrency=1
+))
+
+registry.register(ToolSpec(
+    name="analyze_multimodal_content",
+    schema=multimodal_tool,
+    entry_point="tools.multimodal_tool:analyze_multimodal_content",
+    mime_types=['text/plain', 'image/jpeg', 'image/png'],
+    cost_class=LOCAL_CPU,
+    max_concurrency=1
+))
+
+registry.register(ToolSpec(
+    name="process_with_gemini",
+    schema=gemini_tool,
+    entry_point="tools.gemini_tool:process_with_gemini",
+    mime_types=GEMINI_MIME_TYPES,
+    cost_class=REMOTE_API,
+    max_concurrency=4
+))
+
+# Work that is usually needed for an attached image, started while GPT-4o picks the tools.
+# Both variants come from one decode in this process; pool workers only receive the classifier input.
+speculative_executor.register('image', SpeculativeTask(
+    tool_name="analyze_multimodal_content",
+    description="image classifier decode" if USE_INFERENCE_POOL else "image classifier warm-up and decode",
+    run=lazy("tools.multimodal_tool:prefetch_classification")
+))
+
+speculative_executor.register('image', SpeculativeTask(
+    tool_name="process_with_gemini",
+    description="Gemini image resize",
+    run=lazy("tools.gemini_tool:prefetch_image")
+))
+
+# Gemini uploads PDFs, audio and video, so start the upload while GPT-4o picks the tools
+for content_category in ['application/pdf', 'audio', 'video']:
+    speculative_executor.register(content_category, SpeculativeTask(
+        tool_name="process_with_gemini",
+        description="Gemini file upload",
+        run=lazy("tools.gemini_tool:prefetch_upload"),
+        discard=lazy("tools.gemini_tool:discard_upload")
+    ))
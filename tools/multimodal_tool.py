@@ -1,83 +1,109 @@
-from transformers import (
-    pipeline,
-    AutoTokenizer,
-    AutoModelForSequenceClassification,
-    AutoImageProcessor,
-    AutoModelForImageClassification,
-    M2M100Tokenizer,
-    M2M100ForConditionalGeneration
-)
-from PIL import Image
-from config.config import translation_model_path, image_model_path
-from tools.sentiment_tool import analyze_sentiment
-
-def analyze_multimodal_content(text=None, file_path=None, translate_source_lang="en", translate_target_lang="fr"):
-    """
-    Analyze text sentiment, classify images, and translate text.
-    """
-    results = {}
-    
-    # Sentiment Analysis
-    if text:
-        sentiment_result = analyze_sentiment(text)
-        results["sentiment_analysis"] = sentiment_result
-    
-    # Image Classification
-    if file_path:
-        try:
-            processor = AutoImageProcessor.from_pretrained(image_model_path)
-            model = AutoModelForImageClassification.from_pretrained(image_model_path)
-            image = Image.open(file_path)
-            image_pipeline = pipeline("image-classification", model=model, feature_extractor=processor)
-            image_result = image_pipeline(image)
-            results["image_classification"] = image_result
-        except Exception as e:
-            results["image_classification_error"] = str(e)
-    
-    # Text Translation
-    if text and translate_source_lang and translate_target_lang:
-        try:
-            tokenizer = M2M100Tokenizer.from_pretrained(translation_model_path)
-            model = M2M100ForConditionalGeneration.from_pretrained(translation_model_path)
-            tokenizer.src_lang = translate_source_lang
-            encoded_text = tokenizer(text, return_tensors="pt")
-            generated_tokens = model.generate(**encoded_text, forced_bos_token_id=tokenizer.get_lang_id(translate_target_lang))
-            translated_text = tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)[0]
-            results["translation"] = translated_text
-        except Exception as e:
-            results["translation_error"] = str(e)
-    
-    return results
-
-# Tool definition for OpenAI function calling with updated parameters
-multimodal_tool = {
-    "type": "function",
-    "function": {
-        "name": "analyze_multimodal_content",
-        "description": "tool can Analyze text sentiment, image classification, and translate text to target language only",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "text": {
-                    "type": "string",
-                    "description": "The text to analyze for sentiment or translate."
-                },
-                "file_path": {
-                    "type": "string",
-                    "description": "The path to the image file for classification."
-                },
-                "translate_source_lang": {
-                    "type": "string",
-                    "description": "The source language for translation (for ex-'en')",
-                    "default": "en"
-                },
-                "translate_target_lang": {
-                    "type": "string",
-                    "description": "The target language for translation (for ex-'fr')",
-                    "default": "fr"
-                }
-            },
-            "required": []
-        }
-    }
-}
\ No newline at end of file
+import threading
+from functools import lru_cache
+from config.config import translation_model_path, image_model_path, USE_INFERENCE_POOL
+from tools.sentiment_tool import analyze_sentiment
+from utils.inference_pool import run_model
+from utils.model_loader import load_pretrained
+from utils.image_prep import image_preparer
+
+_classifier_lock = threading.Lock()
+_translator_lock = threading.Lock()
+
+# transformers is imported inside the loaders so importing this module stays cheap
+@lru_cache(maxsize=1)
+def _build_image_classifier():
+    from transformers import pipeline, AutoImageProcessor, AutoModelForImageClassification
+
+    processor = AutoImageProcessor.from_pretrained(image_model_path)
+    model = load_pretrained(AutoModelForImageClassification, image_model_path, name="image_classification")
+    return pipeline("image-classification", model=model, feature_extractor=processor)
+
+def load_image_classifier():
+    """Load the image classification pipeline once and reuse it across calls"""
+    # The lock stops a speculative warm-up and a real call from loading the weights twice
+    with _classifier_lock:
+        return _build_image_classifier()
+
+@lru_cache(maxsize=1)
+def _build_translator():
+    from transformers import M2M100Tokenizer, M2M100ForConditionalGeneration
+
+    tokenizer = M2M100Tokenizer.from_pretrained(translation_model_path)
+    model = load_pretrained(M2M100ForConditionalGeneration, translation_model_path, name="translation")
+    return tokenizer, model
+
+def load_translator():
+    """Load the M2M100 tokenizer and model once and reuse them across calls"""
+    with _translator_lock:
+        return _build_translator()
+
+@lru_cache(maxsize=1)
+def _classifier_input_side() -> int:
+    """The side the classifier's processor resizes to, read without loading the model"""
+    from transformers import AutoImageProcessor
+
+    size = AutoImageProcessor.from_pretrained(image_model_path).size
+    return max(size.values()) if isinstance(size, dict) else size
+
+def prepare_classifier_input(file_path):
+    """Decode and downscale the image just enough for the classifier's input size"""
+    return image_preparer.prepare(file_path, 'classifier', min_side=_classifier_input_side())
+
+def prefetch_classification(file_path):
+    """Prepare the classifier input ahead of a call, loading the model too when it runs in this process"""
+    if not USE_INFERENCE_POOL:
+        load_image_classifier()
+    return prepare_classifier_input(file_path)
+
+def classify_prepared_image(image):
+    """Classify an image returned by prepare_classifier_input and return the label/score list"""
+    return load_image_classifier()(image)
+
+def classify_image(file_path):
+    """Classify the image at file_path and return the label/score list"""
+    # Decoded here, next to the Gemini variant, so the pool worker only receives the small image
+    return run_model("tools.multimodal_tool:classify_prepared_image", prepare_classifier_input(file_path))
+
+def translate_text(text, source_lang, target_lang):
+    """Translate text with M2M100 and return the translated string"""
+    tokenizer, model = load_translator()
+    # src_lang is tokenizer state, so concurrent translations must not interleave here
+    with _translator_lock:
+        tokenizer.src_lang = source_lang
+        encoded_text = tokenizer(text, return_tensors="pt")
+    generated_tokens = model.generate(**encoded_text, forced_bos_token_id=tokenizer.get_lang_id(target_lang))
+    return tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)[0]
+
+def analyze_multimodal_content(text=None, file_path=None, translate_source_lang="en", translate_target_lang="fr"):
+    """
+    Analyze text sentiment, classify images, and translate text.
+    """
+    results = {}
+    
+    # Sentiment Analysis
+    if text:
+        sentiment_result = analyze_sentiment(text)
+        results["sentiment_analysis"] = sentiment_result
+    
+    # Image Classification
+    if file_path:
+        try:
+            image_result = classify_image(file_path)
+            results["image_classification"] = image_result
+        except Exception as e:
+            results["image_classification_error"] = str(e)
+    
+    # Text Translation
+    if text and translate_source_lang and translate_target_lang:
+        try:
+            translated_text = run_model(
+                "tools.multimodal_tool:translate_text",
+                text,
+                translate_source_lang,
+                translate_target_lang
+            )
+            results["translation"] = translated_text
+        except Exception as e:
+            results["translation_error"] = str(e)
+    
+    return results
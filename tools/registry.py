@@ -0,0 +1,125 @@
+# registry.py
+import contextvars
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from config.config import TOOL_POOL_SIZES
+
+# Cost classes decide which worker pool a tool call runs on
+LOCAL_CPU = "local_cpu"
+REMOTE_API = "remote_api"
+
+def minify_schema(value: Any) -> Any:
+    """Copy of a schema with keys sorted and runs of whitespace in descriptions collapsed"""
+    if isinstance(value, dict):
+        return {
+            key: " ".join(item.split()) if key == 'description' and isinstance(item, str) else minify_schema(item)
+            for key, item in sorted(value.items())
+        }
+    if isinstance(value, list):
+        return [minify_schema(item) for item in value]
+    return value
+
+@dataclass
+class ToolSpec:
+    name: str
+    schema: Dict
+    entry_point: str
+    mime_types: List[str] = field(default_factory=list)
+    cost_class: str = LOCAL_CPU
+    max_concurrency: int = 1
+
+class ToolRegistry:
+    """
+    Tools declare their OpenAI schema, supported MIME types, cost class and concurrency
+    limit here. The implementing function is imported on first use from entry_point
+    ("module:function"), and calls run on the pool of the tool's cost class.
+    """
+
+    def __init__(self, pool_sizes: Dict[str, int]):
+        self._specs: Dict[str, ToolSpec] = {}
+        self._by_mime_type: Dict[str, List[ToolSpec]] = {}
+        self._functions: Dict[str, Callable] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._schemas: Optional[List[Dict]] = None
+        self._pools = {
+            cost_class: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"tools_{cost_class}")
+            for cost_class, size in pool_sizes.items()
+        }
+        self._lock = threading.Lock()
+
+    def register(self, spec: ToolSpec):
+        """Add or replace a tool and update the lookup tables"""
+        if spec.cost_class not in self._pools:
+            raise ValueError(f"Unknown cost class for {spec.name}: {spec.cost_class}")
+        with self._lock:
+            previous = self._specs.get(spec.name)
+            if previous:
+                for mime_type in previous.mime_types:
+                    self._by_mime_type[mime_type].remove(previous)
+            self._specs[spec.name] = spec
+            for mime_type in spec.mime_types:
+                self._by_mime_type.setdefault(mime_type, []).append(spec)
+            self._functions.pop(spec.name, None)
+            self._semaphores[spec.name] = threading.BoundedSemaphore(spec.max_concurrency)
+            self._schemas = None
+
+    def load_modules(self, module_names: List[str]):
+        """Import the manifests (or tool modules) that register tools"""
+        for module_name in module_names:
+            importlib.import_module(module_name)
+
+    def get(self, name: str) -> ToolSpec:
+        spec = self._specs.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown tool: {name}")
+        return spec
+
+    def schemas(self) -> List[Dict]:
+        """
+        OpenAI function-calling schemas of all registered tools.
+
+        Minified and ordered by tool name, so every request sends byte-identical
+        tools regardless of import order and the prompt prefix stays cacheable.
+        """
+        with self._lock:
+            if self._schemas is None:
+                self._schemas = [minify_schema(spec.schema) for _, spec in sorted(self._specs.items())]
+            return self._schemas
+
+    def mime_types(self) -> List[str]:
+        """Every MIME type accepted by at least one tool"""
+        return list(self._by_mime_type)
+
+    def for_content_type(self, content_type: str) -> List[ToolSpec]:
+        """Tools that accept files of the given MIME type"""
+        return list(self._by_mime_type.get(content_type, []))
+
+    def resolve(self, name: str) -> Callable:
+        """Import and cache the function behind a tool"""
+        function = self._functions.get(name)
+        if function is None:
+            module_name, function_name = self.get(name).entry_point.split(':')
+            function = getattr(importlib.import_module(module_name), function_name)
+            self._functions[name] = function
+        return function
+
+    def _run(self, name: str, args: Dict) -> Any:
+        with self._semaphores[name]:
+            return self.resolve(name)(**args)
+
+    def submit(self, name: str, args: Dict):
+        """Schedule a tool call on the pool for its cost class and return the future"""
+        spec = self.get(name)
+        # Carry context variables (e.g. the usage scope of the current query) into the worker thread
+        context = contextvars.copy_context()
+        return self._pools[spec.cost_class].submit(context.run, self._run, name, args)
+
+    def call(self, name: str, args: Dict) -> Any:
+        """Run a tool call on its pool and wait for the result"""
+        return self.submit(name, args).result()
+
+# Create singleton instance
+registry = ToolRegistry(TOOL_POOL_SIZES)
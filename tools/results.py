@@ -0,0 +1,69 @@
+# results.py
+import json
+from typing import Any, Dict, List, Optional
+from config.config import TOOL_RESULT_LIMITS
+
+def truncate_strings(value: Any, limit: int) -> Any:
+    """Copy of value with every string longer than limit cut down"""
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit] + f"... [truncated {len(value) - limit} chars]"
+    if isinstance(value, dict):
+        return {key: truncate_strings(item, limit) for key, item in value.items()}
+    if isinstance(value, list):
+        return [truncate_strings(item, limit) for item in value]
+    return value
+
+class ToolResult:
+    """
+    The outcome of one tool call.
+
+    It is serialized to compact JSON at most once, and each consumer (LLM prompt,
+    conversation log, UI) gets a view cut down to its own size limit, so large tool
+    outputs are not re-encoded or copied for every consumer.
+    """
+    __slots__ = ('tool_name', 'arguments', 'result', 'error', '_json', '_views')
+
+    def __init__(self, tool_name: str, arguments: Dict = None, result: Any = None, error: str = None):
+        self.tool_name = tool_name
+        self.arguments = arguments
+        self.result = result
+        self.error = error
+        self._json: Optional[str] = None
+        self._views: Dict[int, str] = {}
+
+    @property
+    def failed(self) -> bool:
+        """Raised an exception, or returned an "Error ..." string as Gemini does"""
+        return self.error is not None or (isinstance(self.result, str) and self.result.startswith("Error"))
+
+    def to_dict(self) -> Dict:
+        if self.error is not None:
+            return {"tool_name": self.tool_name, "error": self.error}
+        return {"tool_name": self.tool_name, "arguments": self.arguments, "result": self.result}
+
+    def to_json(self) -> str:
+        """Full compact JSON, encoded on first use"""
+        if self._json is None:
+            self._json = json.dumps(self.to_dict(), separators=(',', ':'), ensure_ascii=False)
+        return self._json
+
+    def view(self, consumer: str, limit: int = None) -> str:
+        """JSON for a consumer, with strings truncated when the result exceeds its size limit"""
+        limit = limit or TOOL_RESULT_LIMITS[consumer]
+        full = self.to_json()
+        if len(full) <= limit:
+            return full
+        view = self._views.get(limit)
+        if view is None:
+            # Shorten individual strings until the whole result fits (or strings are already short)
+            string_limit = limit
+            view = json.dumps(truncate_strings(self.to_dict(), string_limit), separators=(',', ':'), ensure_ascii=False)
+            while len(view) > limit and string_limit > 100:
+                string_limit //= 2
+                view = json.dumps(truncate_strings(self.to_dict(), string_limit), separators=(',', ':'), ensure_ascii=False)
+            self._views[limit] = view
+        return view
+
+def serialize_results(results: List[ToolResult], consumer: str, limit: int = None) -> str:
+    """JSON array of the consumer views of results"""
+    return "[" + ",".join(result.view(consumer, limit) for result in results) + "]"
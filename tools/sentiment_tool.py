@@ -1,57 +1,130 @@
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
-from config.config import sentiment_model_path
-
-def analyze_sentiment(text,file_path=None):
-    """
-    Analyze the sentiment of the input text using the 'cardiffnlp/twitter-roberta-base-sentiment' model.
-    Returns a sentiment score and label.
-    """
-    # Load the model and tokenizer from the local path
-    tokenizer = AutoTokenizer.from_pretrained(sentiment_model_path)
-    model = AutoModelForSequenceClassification.from_pretrained(sentiment_model_path)
-    
-    # Create a sentiment analysis pipeline
-    sentiment_pipeline = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
-    
-    # Get the sentiment result
-    result = sentiment_pipeline(text)[0]
-    
-    # Map the label to a sentiment score (-1 to 1)
-    label_to_score = {
-        "LABEL_0": -1,  # Negative
-        "LABEL_1": 0,   # Neutral
-        "LABEL_2": 1    # Positive
-    }
-
-    sentiment = {
-        "LABEL_0": 'Negative',  # Negative
-        "LABEL_1": 'Neutral',   # Neutral
-        "LABEL_2": 'Positive'    # Positive
-    }
-    
-    sentiment_score = label_to_score.get(result["label"], 0)
-    sentiment_label = sentiment.get(result["label"],'Neutral')
-    
-    return {
-        "sentiment_score": sentiment_score,
-        "sentiment_label": sentiment_label
-    }
-
-# Tool definition for OpenAI function calling
-sentiment_tool = {
-    "type": "function",
-    "function": {
-        "name": "analyze_sentiment",
-        "description": "Analyze the sentiment of a given text and return the sentiment score and label.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "text": {
-                    "type": "string",
-                    "description": "The text to analyze for sentiment."
-                }
-            },
-            "required": ["text"]
-        }
-    }
-}
\ No newline at end of file
+import threading
+from functools import lru_cache
+from config.config import sentiment_model_path, SENTIMENT_WINDOW_TOKENS, SENTIMENT_WINDOW_OVERLAP, SENTIMENT_BATCH_SIZE, SENTIMENT_NEUTRAL_BAND
+from utils.inference_pool import run_model
+from utils.content_type import content_sniffer
+from utils.model_loader import load_pretrained
+
+_sentiment_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _build_sentiment_pipeline():
+    # transformers is imported here so importing this module stays cheap
+    from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+
+    # Load the model and tokenizer from the local path
+    tokenizer = AutoTokenizer.from_pretrained(sentiment_model_path)
+    model = load_pretrained(AutoModelForSequenceClassification, sentiment_model_path, name="sentiment")
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+def load_sentiment_pipeline():
+    """Load the sentiment pipeline once and reuse it across calls"""
+    with _sentiment_lock:
+        return _build_sentiment_pipeline()
+
+def classify_windows(text):
+    """
+    Score text in overlapping token windows that each fit the model.
+
+    Text is tokenized once and the window texts are scored in batches. Returns
+    one entry per window with its character span, token count and label
+    probabilities; short text gives a single window.
+    """
+    classifier = load_sentiment_pipeline()
+    tokenizer = classifier.tokenizer
+    # Two positions are reserved for the special tokens (and RoBERTa's padding offset)
+    max_tokens = getattr(classifier.model.config, 'max_position_embeddings', 514) - 4
+    window = min(SENTIMENT_WINDOW_TOKENS, max_tokens)
+    step = max(1, window - SENTIMENT_WINDOW_OVERLAP)
+
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+    spans = []
+    for start in range(0, len(offsets), step):
+        chunk = offsets[start:start + window]
+        spans.append((chunk[0][0], chunk[-1][1], len(chunk)))
+        if start + window >= len(offsets):
+            break
+    if not spans:
+        spans = [(0, len(text), 0)]
+
+    # The tokenizer config has no model_max_length, so give the limit explicitly:
+    # re-tokenizing a window's text can yield a token or two more than its span
+    outputs = classifier([text[start:end] for start, end, _ in spans], batch_size=SENTIMENT_BATCH_SIZE,
+                         top_k=None, truncation=True, max_length=max_tokens + 2)
+    return [
+        {'start': start, 'end': end, 'tokens': tokens, 'scores': {item['label']: item['score'] for item in output}}
+        for (start, end, tokens), output in zip(spans, outputs)
+    ]
+
+# Map the label to a sentiment score (-1 to 1)
+label_to_score = {
+    "LABEL_0": -1,  # Negative
+    "LABEL_1": 0,   # Neutral
+    "LABEL_2": 1    # Positive
+}
+
+sentiment = {
+    "LABEL_0": 'Negative',  # Negative
+    "LABEL_1": 'Neutral',   # Neutral
+    "LABEL_2": 'Positive'    # Positive
+}
+
+def _window_score(scores):
+    """Expected sentiment (-1 to 1) of a window from its label probabilities"""
+    return sum(label_to_score.get(label, 0) * probability for label, probability in scores.items())
+
+def _score_label(score):
+    if score > SENTIMENT_NEUTRAL_BAND:
+        return 'Positive'
+    if score < -SENTIMENT_NEUTRAL_BAND:
+        return 'Negative'
+    return 'Neutral'
+
+def analyze_sentiment(text=None,file_path=None):
+    """
+    Analyze the sentiment of the input text using the 'cardiffnlp/twitter-roberta-base-sentiment' model.
+    Returns a sentiment score and label.
+
+    Text longer than the model's 512-token limit (or a text file_path when no text
+    is given) is scored as a document: overlapping windows are aggregated into a
+    document score, with a per-section breakdown.
+    """
+    if not text and file_path:
+        # main.py passes the attached file to every tool, which may be an image or a PDF
+        content_type = content_sniffer.content_type(file_path)
+        if content_type != 'text/plain':
+            return {"error": f"Cannot analyze the sentiment of {content_type} content; pass its text instead"}
+        with open(file_path, encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    if not text:
+        return {"error": "No text to analyze"}
+
+    # Get the window results (in the inference worker pool when enabled)
+    windows = run_model("tools.sentiment_tool:classify_windows", text)
+
+    if len(windows) == 1:
+        result = max(windows[0]['scores'].items(), key=lambda item: item[1])[0]
+        return {
+            "sentiment_score": label_to_score.get(result, 0),
+            "sentiment_label": sentiment.get(result, 'Neutral')
+        }
+
+    # Document mode: weight each window by its token count
+    sections = []
+    for window in windows:
+        score = _window_score(window['scores'])
+        sections.append({
+            "start": window['start'],
+            "end": window['end'],
+            "preview": " ".join(text[window['start']:window['end']].split()[:12]),
+            "sentiment_score": round(score, 3),
+            "sentiment_label": _score_label(score)
+        })
+    total_tokens = sum(window['tokens'] for window in windows)
+    document_score = sum(_window_score(window['scores']) * window['tokens'] for window in windows) / total_tokens
+
+    return {
+        "sentiment_score": round(document_score, 3),
+        "sentiment_label": _score_label(document_score),
+        "sections": sections
+    }
@@ -0,0 +1,231 @@
+# analytics.py
+"""
+Usage and latency reports over the conversation log.
+
+Reads the live CSV, the rotated CSV segments and the monthly Parquet files in
+the archive (or a SQLite table), loading only the columns each report needs.
+
+Usage:
+    python -m utils.analytics [--since 2025-01-01] [--until 2025-02-01] [--sqlite path.db]
+"""
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from utils.logger import enhanced_logger
+
+REPORT_COLUMNS = ['timestamp', 'tool_name', 'file_type', 'latency_ms', 'tool_latency_ms', 'tool_errors', 'response_chars']
+
+# Rows logged before a column existed are derived from the (much larger) raw column instead
+FALLBACK_COLUMNS = {
+    'tool_errors': 'tool_response',
+    'response_chars': 'final_response'
+}
+
+QUANTILES = [0.5, 0.9, 0.95, 0.99]
+
+SEGMENT_TIME = re.compile(r'conversation_(\d{8}_\d{6})')
+PARQUET_MONTH = re.compile(r'conversations_(\d{4}-\d{2})\.parquet$')
+
+def _select_columns(available: List[str], wanted: List[str]) -> List[str]:
+    columns = [column for column in wanted if column in available]
+    for derived, source in FALLBACK_COLUMNS.items():
+        if derived in wanted and derived not in available and source in available:
+            columns.append(source)
+    return columns
+
+def _filter_dates(df: pd.DataFrame, start: Optional[datetime], end: Optional[datetime]) -> pd.DataFrame:
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601', errors='coerce')
+    if start:
+        df = df[df['timestamp'] >= start]
+    if end:
+        df = df[df['timestamp'] < end]
+    return df
+
+def read_csv(path: str, columns: List[str], start: datetime = None, end: datetime = None) -> pd.DataFrame:
+    """Read the requested columns of a (possibly gzipped) conversation CSV"""
+    available = list(pd.read_csv(path, nrows=0).columns)
+    df = pd.read_csv(path, usecols=_select_columns(available, columns), dtype=str, keep_default_na=False)
+    return _filter_dates(df, start, end)
+
+def read_parquet(path: str, columns: List[str], start: datetime = None, end: datetime = None) -> pd.DataFrame:
+    """Read the requested columns of a compacted Parquet file, pushing the date range down"""
+    import pyarrow.parquet as pq
+
+    available = pq.read_schema(path).names
+    filters = []
+    if start:
+        filters.append(('timestamp', '>=', pd.Timestamp(start)))
+    if end:
+        filters.append(('timestamp', '<', pd.Timestamp(end)))
+    return pd.read_parquet(path, columns=_select_columns(available, columns), filters=filters or None)
+
+def read_sqlite(path: str, columns: List[str], start: datetime = None, end: datetime = None,
+                table: str = 'conversations') -> pd.DataFrame:
+    """Read the requested columns from a SQLite table, filtering the date range in SQL"""
+    with sqlite3.connect(path) as conn:
+        available = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+        selected = ', '.join(f'"{column}"' for column in _select_columns(available, columns))
+        clauses, params = [], []
+        if start:
+            clauses.append('timestamp >= ?')
+            params.append(start.isoformat())
+        if end:
+            clauses.append('timestamp < ?')
+            params.append(end.isoformat())
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        df = pd.read_sql_query(f'SELECT {selected} FROM "{table}"{where}', conn, params=params)
+    return _filter_dates(df, None, None)
+
+def load_conversations(columns: List[str] = None,
+                       start: datetime = None,
+                       end: datetime = None,
+                       csv_path: str = None,
+                       archive_dir: str = None,
+                       sqlite_path: str = None) -> pd.DataFrame:
+    """
+    Load conversations from SQLite, or from the live CSV plus everything in the archive.
+
+    Archive files that cannot contain rows in [start, end) are skipped by file name.
+    """
+    columns = columns or REPORT_COLUMNS
+    if sqlite_path:
+        return read_sqlite(sqlite_path, columns, start, end)
+
+    csv_path = csv_path or enhanced_logger.csv_path
+    archive_dir = archive_dir or enhanced_logger.archive_dir
+    frames = []
+
+    for path in sorted(glob.glob(os.path.join(archive_dir, 'conversations_*.parquet'))):
+        month = PARQUET_MONTH.search(path)
+        if month:
+            month_start = datetime.strptime(month.group(1), '%Y-%m')
+            if (end and month_start >= end) or (start and month_start + timedelta(days=31) < start):
+                continue
+        frames.append(read_parquet(path, columns, start, end))
+
+    for path in sorted(glob.glob(os.path.join(archive_dir, 'conversation_*.csv.gz'))):
+        rotated = SEGMENT_TIME.search(path)
+        # A segment only holds rows written before it was rotated
+        if start and rotated and datetime.strptime(rotated.group(1), '%Y%m%d_%H%M%S') < start:
+            continue
+        frames.append(read_csv(path, columns, start, end))
+
+    if os.path.exists(csv_path):
+        frames.append(read_csv(csv_path, columns, start, end))
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+def _tool_calls(df: pd.DataFrame) -> pd.Series:
+    names = df['tool_name'].replace('', np.nan).dropna().str.split(', ').explode().str.strip()
+    return names[names != '']
+
+def _tool_errors(df: pd.DataFrame) -> pd.Series:
+    """One entry per failed tool call, by tool name"""
+    errors = []
+    if 'tool_errors' in df:
+        errors.append(df['tool_errors'].dropna().astype(str).str.extractall(r'"([^"]+)"')[0])
+    if 'tool_response' in df:
+        # Older rows only have the "Error in <tool>: ..." strings inside the tool response
+        rows = df['tool_response'] if 'tool_errors' not in df else df.loc[df['tool_errors'].isna(), 'tool_response']
+        errors.append(rows.dropna().astype(str).str.extractall(r'Error in (\w+):')[0])
+    return pd.concat(errors, ignore_index=True) if errors else pd.Series(dtype=str)
+
+def _quantiles(values: pd.Series) -> Dict[str, float]:
+    values = pd.to_numeric(values, errors='coerce').dropna().to_numpy()
+    if values.size == 0:
+        return {f"p{int(q * 100)}": np.nan for q in QUANTILES}
+    return {f"p{int(q * 100)}": value for q, value in zip(QUANTILES, np.quantile(values, QUANTILES))}
+
+def compute_report(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Compute the usage, latency, error and size aggregates for a conversation frame"""
+    report = {}
+    rows = len(df)
+
+    latency = pd.to_numeric(df['latency_ms'], errors='coerce') if 'latency_ms' in df else pd.Series(np.nan, index=df.index)
+    response_chars = pd.to_numeric(df['response_chars'], errors='coerce') if 'response_chars' in df else pd.Series(np.nan, index=df.index)
+    if 'final_response' in df:
+        response_chars = response_chars.fillna(df['final_response'].str.len())
+
+    calls = _tool_calls(df)
+    errors = _tool_errors(df)
+    call_counts = calls.value_counts()
+    error_counts = errors.value_counts().reindex(call_counts.index, fill_value=0)
+
+    report['overview'] = pd.DataFrame([{
+        'queries': rows,
+        'first': df['timestamp'].min() if rows else None,
+        'last': df['timestamp'].max() if rows else None,
+        'tool_calls': int(call_counts.sum()),
+        'tool_errors': int(len(errors)),
+        'error_rate': len(errors) / call_counts.sum() if call_counts.sum() else 0.0,
+        'latency_mean_ms': latency.mean(),
+        **{f"latency_{key}_ms": value for key, value in _quantiles(latency).items()}
+    }])
+
+    report['tool_usage'] = pd.DataFrame({
+        'calls': call_counts,
+        'errors': error_counts,
+        'error_rate': (error_counts / call_counts).fillna(0.0)
+    })
+
+    if 'tool_latency_ms' in df:
+        pairs = df['tool_latency_ms'].replace('', np.nan).dropna().astype(str).str.extractall(r'"([^"]+)":\s*([\d.]+)')
+        if not pairs.empty:
+            pairs.columns = ['tool', 'ms']
+            pairs['ms'] = pairs['ms'].astype(float)
+            grouped = pairs.groupby('tool')['ms']
+            report['tool_latency_ms'] = grouped.quantile(QUANTILES).unstack().rename(
+                columns=lambda q: f"p{int(q * 100)}").assign(mean=grouped.mean(), count=grouped.size())
+
+    file_types = df['file_type'].replace('', np.nan).fillna('(none)')
+    report['file_types'] = pd.DataFrame({
+        'queries': file_types.value_counts(),
+        'share': file_types.value_counts(normalize=True)
+    })
+
+    report['response_chars'] = pd.DataFrame([{
+        'mean': response_chars.mean(),
+        'max': response_chars.max(),
+        **_quantiles(response_chars)
+    }])
+
+    if rows:
+        daily = pd.DataFrame({'day': df['timestamp'].dt.date, 'latency_ms': latency})
+        report['daily'] = daily.groupby('day')['latency_ms'].agg(queries='size', latency_p95_ms=lambda v: v.quantile(0.95))
+
+    return report
+
+def _parse_date(value: str) -> datetime:
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def main():
+    parser = argparse.ArgumentParser(description="Tool usage and latency report over the conversation log")
+    parser.add_argument('--since', type=_parse_date, help="First day to include (YYYY-MM-DD)")
+    parser.add_argument('--until', type=_parse_date, help="First day to exclude (YYYY-MM-DD)")
+    parser.add_argument('--csv', dest='csv_path', help="Live conversation CSV (default: logs/conversation.csv)")
+    parser.add_argument('--archive-dir', help="Archive of rotated segments and Parquet files (default: logs/archive)")
+    parser.add_argument('--sqlite', dest='sqlite_path', help="Read a 'conversations' table from this SQLite file instead")
+    args = parser.parse_args()
+
+    df = load_conversations(
+        start=args.since,
+        end=args.until,
+        csv_path=args.csv_path,
+        archive_dir=args.archive_dir,
+        sqlite_path=args.sqlite_path
+    )
+    for name, table in compute_report(df).items():
+        print(f"\n== {name} ==")
+        print(table.to_string())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# compact_logs.py
+"""
+Offline compaction of archived conversation logs.
+
+Rotated CSV segments (logs/archive/conversation_*.csv.gz) are merged into one
+Parquet file per month (logs/archive/conversations_YYYY-MM.parquet) so months
+of traffic can be analysed without re-parsing CSV.
+
+Usage:
+    python -m utils.compact_logs [--archive-dir logs/archive] [--older-than-days 1]
+"""
+import argparse
+import glob
+import os
+import re
+import time
+import pandas as pd
+from typing import Dict, List
+from utils.logger import enhanced_logger
+
+SEGMENT_PATTERN = re.compile(r'conversation_(\d{4})(\d{2})\d{2}_\d{6}(?:_\d+)?\.csv\.gz$')
+
+def find_segments(archive_dir: str, older_than_days: float = 0) -> Dict[str, List[str]]:
+    """Group archived CSV segments by month (YYYY-MM), skipping recent ones"""
+    cutoff = time.time() - older_than_days * 86400
+    months = {}
+    for path in sorted(glob.glob(os.path.join(archive_dir, 'conversation_*.csv.gz'))):
+        match = SEGMENT_PATTERN.search(os.path.basename(path))
+        if not match or os.path.getmtime(path) > cutoff:
+            continue
+        months.setdefault(f"{match.group(1)}-{match.group(2)}", []).append(path)
+    return months
+
+def compact_month(archive_dir: str, month: str, segments: List[str]) -> str:
+    """Merge the segments of one month into its Parquet file and return the file path"""
+    parquet_path = os.path.join(archive_dir, f"conversations_{month}.parquet")
+    frames = [pd.read_parquet(parquet_path)] if os.path.exists(parquet_path) else []
+    frames += [pd.read_csv(path, dtype=str, keep_default_na=False, compression='gzip') for path in segments]
+
+    df = pd.concat(frames, ignore_index=True)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    df = df.sort_values('timestamp', kind='stable')
+
+    # Write next to the target and swap in, so a failed run never leaves a partial file
+    tmp_path = parquet_path + '.tmp'
+    df.to_parquet(tmp_path, index=False, compression='zstd')
+    os.replace(tmp_path, parquet_path)
+
+    # The segments must go once merged: analytics reads them alongside the Parquet file, and a
+    # later run would merge them again
+    for path in segments:
+        os.remove(path)
+    enhanced_logger.logger.info(f"Compacted {len(segments)} segments into {parquet_path} ({len(df)} rows)")
+    return parquet_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact archived conversation logs into monthly Parquet files")
+    parser.add_argument('--archive-dir', default=enhanced_logger.archive_dir)
+    parser.add_argument('--older-than-days', type=float, default=1,
+                        help="Only compact segments last modified at least this many days ago")
+    args = parser.parse_args()
+
+    months = find_segments(args.archive_dir, args.older_than_days)
+    if not months:
+        print("No archived segments to compact")
+        return
+
+    for month, segments in months.items():
+        path = compact_month(args.archive_dir, month, segments)
+        print(f"{month}: {len(segments)} segments -> {path}")
+
+if __name__ == "__main__":
+    main()
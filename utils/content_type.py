@@ -0,0 +1,278 @@
+# content_type.py
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from config.config import SNIFF_BYTES, CONTENT_CACHE_SIZE, PDF_SCAN_BYTES, MAX_UPLOAD_BYTES, CONTENT_LIMITS, GEMINI_TOKEN_RATES
+
+@dataclass(frozen=True)
+class ContentInfo:
+    mime_type: str
+    size: int
+    sniffed: bool  # False when the type could only be guessed from the extension
+    duration_seconds: Optional[float] = None
+    pages: Optional[int] = None
+
+# MPEG audio Layer III bitrates (kbps) by bitrate index, and sample rates by version
+_MP3_BITRATES = {
+    'mpeg1': [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    'mpeg2': [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+# ISO base media (ftyp) major brands; anything else is left unrecognized
+_FTYP_BRANDS = {
+    b'qt  ': 'video/quicktime',
+    b'M4A ': 'audio/mp4', b'M4B ': 'audio/mp4', b'M4P ': 'audio/mp4',
+    b'heic': 'image/heic', b'heix': 'image/heic', b'heim': 'image/heic', b'heis': 'image/heic',
+    b'hevc': 'image/heic-sequence', b'hevx': 'image/heic-sequence',
+    b'mif1': 'image/heif', b'msf1': 'image/heif-sequence',
+    b'avif': 'image/avif', b'avis': 'image/avif',
+    b'3gp4': 'video/3gpp', b'3gp5': 'video/3gpp', b'3gp6': 'video/3gpp', b'3g2a': 'video/3gpp2',
+    **{brand: 'video/mp4' for brand in (b'isom', b'iso2', b'iso4', b'iso5', b'iso6', b'mp41', b'mp42',
+                                        b'avc1', b'dash', b'mmp4', b'M4V ', b'M4VH', b'M4VP', b'f4v ')}
+}
+
+_PDF_LINEARIZED_PAGES = re.compile(rb'/Linearized\b[^>]*?/N\s+(\d+)')
+_PDF_PAGE_COUNT = re.compile(rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b')
+
+def sniff(head: bytes) -> Optional[str]:
+    """MIME type from the magic bytes at the start of a file, or None if unrecognized"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'audio/wav'
+    if head.startswith(b'%PDF-'):
+        return 'application/pdf'
+    if head[4:8] == b'ftyp':
+        return _FTYP_BRANDS.get(head[8:12])
+    if head.startswith(b'\x00\x00\x01\xba') or head.startswith(b'\x00\x00\x01\xb3'):
+        return 'video/mpeg'
+    if head.startswith(b'ID3'):
+        return 'audio/mpeg'
+    if len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        # Frame sync: layer bits 00 mean an AAC ADTS stream rather than MP3
+        return 'audio/aac' if head[1] & 0x06 == 0 else 'audio/mpeg'
+    if head.startswith(b'OggS'):
+        return 'audio/ogg'
+    if head.startswith(b'fLaC'):
+        return 'audio/flac'
+    if head and b'\x00' not in head:
+        try:
+            # The sample may end in the middle of a multi-byte character
+            head.decode('utf-8')
+            return 'text/plain'
+        except UnicodeDecodeError as e:
+            if e.start >= len(head) - 3:
+                return 'text/plain'
+    return None
+
+def _mp3_duration(f, size: int, head: bytes) -> Optional[float]:
+    """Exact from a Xing/Info header when present, otherwise estimated from the first frame's bitrate"""
+    offset = 0
+    if head.startswith(b'ID3') and len(head) >= 10:
+        offset = 10 + ((head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | (head[9] & 0x7F))
+    f.seek(offset)
+    data = f.read(4096)
+    index = next((i for i in range(len(data) - 3) if data[i] == 0xFF and data[i + 1] & 0xE0 == 0xE0), None)
+    if index is None:
+        return None
+    version, layer = (data[index + 1] >> 3) & 3, (data[index + 1] >> 1) & 3
+    bitrate_index, sample_index = data[index + 2] >> 4, (data[index + 2] >> 2) & 3
+    if layer != 1 or version not in _MP3_SAMPLE_RATES or sample_index == 3 or bitrate_index in (0, 15):
+        return None
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_index]
+
+    for tag in (b'Xing', b'Info'):
+        xing = data.find(tag, index, index + 64)
+        if xing != -1 and data[xing + 7] & 1:
+            frames = int.from_bytes(data[xing + 8:xing + 12], 'big')
+            return frames * (1152 if version == 3 else 576) / sample_rate
+
+    bitrate = _MP3_BITRATES['mpeg1' if version == 3 else 'mpeg2'][bitrate_index] * 1000
+    return (size - offset - index) * 8 / bitrate
+
+def _wav_duration(f) -> Optional[float]:
+    f.seek(12)
+    byte_rate = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        chunk_id, chunk_size = header[:4], int.from_bytes(header[4:], 'little')
+        if chunk_id == b'fmt ':
+            byte_rate = int.from_bytes(f.read(chunk_size)[8:12], 'little')
+            f.seek(chunk_size & 1, 1)
+        elif chunk_id == b'data':
+            return chunk_size / byte_rate if byte_rate else None
+        else:
+            f.seek(chunk_size + (chunk_size & 1), 1)
+
+def _mp4_atoms(f, start: int, end: int):
+    """(type, body offset, end offset) of the atoms between start and end, reading only their headers"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(16)
+        atom_size, header_size = int.from_bytes(header[:4], 'big'), 8
+        if atom_size == 1:
+            atom_size, header_size = int.from_bytes(header[8:16], 'big'), 16
+        elif atom_size == 0:
+            atom_size = end - offset
+        if atom_size < header_size:
+            return
+        yield header[4:8], offset + header_size, offset + atom_size
+        offset += atom_size
+
+def _mp4_duration(f, size: int) -> Optional[float]:
+    """Duration from the movie header (moov/mvhd), which may sit at the end of the file"""
+    for kind, body, end in _mp4_atoms(f, 0, size):
+        if kind != b'moov':
+            continue
+        for inner, inner_body, _ in _mp4_atoms(f, body, end):
+            if inner == b'mvhd':
+                f.seek(inner_body)
+                data = f.read(32)
+                if data[0] == 1:
+                    timescale, duration = int.from_bytes(data[20:24], 'big'), int.from_bytes(data[24:32], 'big')
+                else:
+                    timescale, duration = int.from_bytes(data[12:16], 'big'), int.from_bytes(data[16:20], 'big')
+                return duration / timescale if timescale else None
+    return None
+
+def _pdf_pages(f, size: int, scan_bytes: int = PDF_SCAN_BYTES) -> Optional[int]:
+    """
+    Page count from the linearization header or the /Count of the page tree.
+
+    Only scan_bytes from each end of the file are read, where writers put the
+    page tree root; None when it is not there (or sits in a compressed stream).
+    """
+    f.seek(0)
+    head = f.read(scan_bytes)
+    linearized = _PDF_LINEARIZED_PAGES.search(head)
+    if linearized:
+        return int(linearized.group(1))
+    windows = [head]
+    if size > scan_bytes:
+        f.seek(max(scan_bytes, size - scan_bytes))
+        windows.append(f.read(scan_bytes))
+    counts = [int(match.group(1) or match.group(2)) for window in windows for match in _PDF_PAGE_COUNT.finditer(window)]
+    return max(counts) if counts else None
+
+class ContentSniffer:
+    """
+    Detects file types from their magic bytes instead of trusting the extension.
+
+    Only the first SNIFF_BYTES are read to decide the type. Verdicts and metadata
+    (audio/video duration, PDF pages) are cached by a hash of those
+    bytes and the file size, so repeated checks of the same upload are cheap.
+    """
+
+    def __init__(self, sniff_bytes: int, cache_size: int):
+        self.sniff_bytes = sniff_bytes
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _metadata(self, file_path: str, mime_type: str, size: int, head: bytes) -> dict:
+        try:
+            with open(file_path, 'rb') as f:
+                if mime_type == 'audio/mpeg':
+                    return {'duration_seconds': _mp3_duration(f, size, head)}
+                if mime_type == 'audio/wav':
+                    return {'duration_seconds': _wav_duration(f)}
+                if mime_type in ('video/mp4', 'video/quicktime', 'audio/mp4'):
+                    return {'duration_seconds': _mp4_duration(f, size)}
+                if mime_type == 'application/pdf':
+                    return {'pages': _pdf_pages(f, size)}
+        except Exception:
+            # Metadata is best effort; a truncated or odd file still has a type
+            pass
+        return {}
+
+    def detect(self, file_path: str) -> ContentInfo:
+        """Type and metadata of a file, sniffed from its content"""
+        size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            head = f.read(self.sniff_bytes)
+        key = (hashlib.blake2b(head, digest_size=16).hexdigest(), size)
+
+        with self._lock:
+            info = self._cache.get(key)
+            if info is not None:
+                self._cache.move_to_end(key)
+                return info
+
+        mime_type = sniff(head)
+        sniffed = mime_type is not None
+        if mime_type is None:
+            mime_type = mimetypes.guess_type(str(file_path))[0] or 'application/octet-stream'
+        info = ContentInfo(mime_type, size, sniffed, **self._metadata(file_path, mime_type, size, head))
+
+        with self._lock:
+            self._cache[key] = info
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return info
+
+    def content_type(self, file_path: Optional[str]) -> str:
+        """MIME type of a file, falling back to its extension when it cannot be read"""
+        if file_path is None:
+            return 'text/plain'
+        try:
+            return self.detect(str(file_path)).mime_type
+        except OSError:
+            return mimetypes.guess_type(str(file_path))[0] or 'application/octet-stream'
+
+    def check(self, file_path: str, supported_types: Iterable[str]) -> Optional[str]:
+        """Why the file should be rejected before any upload or model call, or None if it is acceptable"""
+        try:
+            info = self.detect(file_path)
+        except OSError as e:
+            return f"Cannot read file: {str(e)}"
+        if info.mime_type not in set(supported_types):
+            return f"Unsupported content type: {info.mime_type}"
+        if MAX_UPLOAD_BYTES and info.size > MAX_UPLOAD_BYTES:
+            return f"File is too large: {info.size / 2**20:.0f} MB (limit {MAX_UPLOAD_BYTES / 2**20:.0f} MB)"
+
+        limits = CONTENT_LIMITS.get(info.mime_type) or CONTENT_LIMITS.get(info.mime_type.split('/')[0], {})
+        if limits.get('max_pages') and info.pages and info.pages > limits['max_pages']:
+            return f"Document has {info.pages} pages (limit {limits['max_pages']})"
+        if limits.get('max_seconds') and info.duration_seconds and info.duration_seconds > limits['max_seconds']:
+            return f"Media is {info.duration_seconds / 60:.0f} minutes long (limit {limits['max_seconds'] / 60:.0f})"
+        return None
+
+def extension_for(mime_type: str, file_name: str = '') -> str:
+    """File extension for mime_type, keeping the original one when it already matches"""
+    extension = os.path.splitext(file_name)[1]
+    if extension and mimetypes.guess_type(f"file{extension}")[0] == mime_type:
+        return extension
+    return mimetypes.guess_extension(mime_type) or extension
+
+def estimate_gemini_tokens(info: ContentInfo) -> Optional[int]:
+    """Rough prompt tokens Gemini bills for a file, from its type and metadata"""
+    # Images are sent resized to at most 768px a side, a single tile
+    category = info.mime_type.split('/')[0]
+    if category == 'image':
+        return GEMINI_TOKEN_RATES['image']
+    if info.mime_type == 'application/pdf' and info.pages:
+        return info.pages * GEMINI_TOKEN_RATES['page']
+    if category in ('audio', 'video') and info.duration_seconds:
+        return round(info.duration_seconds * GEMINI_TOKEN_RATES[f'{category}_second'])
+    if category == 'text':
+        # About 4 characters per token
+        return info.size // 4
+    return None
+
+# Create singleton instance
+content_sniffer = ContentSniffer(SNIFF_BYTES, CONTENT_CACHE_SIZE)
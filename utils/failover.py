@@ -0,0 +1,213 @@
+# failover.py
+"""
+Failover and hedging across interchangeable backends.
+
+A FailoverRouter tries its backends in order of preference. Each backend has a
+circuit breaker: after repeated failures it is skipped until a cool-down has
+passed, then a single probe request decides whether it is healthy again. When
+hedging is on and the current backend is slower than its own recent p95
+latency, the request is also sent to the next backend and the first successful
+answer wins.
+
+Only a backend's own failures (BackendError, connection errors and timeouts)
+count against its circuit breaker and trigger failover. Anything else a
+backend returns, including "Error ..." strings about a bad or unsupported
+input, is passed straight back to the caller: another backend would fail the
+same way, and one bad request must not take a backend out for everyone.
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.logger import enhanced_logger
+from config.config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    HEDGE_REQUESTS,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    FAILOVER_LATENCY_WINDOW
+)
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class BackendError(Exception):
+    """Raised by a backend call when the backend itself failed (transport, API or timeout)"""
+
+# Exceptions that mean the backend failed rather than the request
+BACKEND_FAILURES = (BackendError, ConnectionError, TimeoutError)
+
+@dataclass
+class Backend:
+    name: str
+    # (prompt, file_path) -> result
+    call: Callable[[str, Optional[str]], Any]
+    # (prompt, content_type) -> whether this backend can serve the request at all
+    supports: Callable[[str, str], bool] = field(default=lambda prompt, content_type: True)
+
+class BackendHealth:
+    """Recent latencies, error counts and circuit breaker state of one backend"""
+
+    def __init__(self, window: int, failure_threshold: int, reset_seconds: float):
+        self.latencies = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; in half-open state only one probe at a time"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """End a request that says nothing about the backend's health, freeing the half-open probe slot"""
+        with self._lock:
+            self._probing = False
+
+    def percentile(self, percent: float, min_samples: int = 1) -> Optional[float]:
+        """Latency percentile in seconds over the window, or None with too few samples"""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    def snapshot(self) -> Dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            'state': self.state,
+            'successes': self.successes,
+            'failures': self.failures,
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+class FailoverRouter:
+    """Sends each request to the first healthy capable backend, failing over and hedging as needed"""
+
+    def __init__(self, name: str, backends: List[Backend], hedge: bool = HEDGE_REQUESTS, max_workers: int = 8):
+        self.name = name
+        self.hedge = hedge
+        self.logger = enhanced_logger.logger
+        self.backends: List[Backend] = []
+        self.health: Dict[str, BackendHealth] = {}
+        for backend in backends:
+            self.add_backend(backend)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-failover")
+
+    def add_backend(self, backend: Backend):
+        """Append a backend; it is tried after the ones already added"""
+        self.backends.append(backend)
+        self.health[backend.name] = BackendHealth(FAILOVER_LATENCY_WINDOW, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+
+    def _timed(self, backend: Backend, prompt: str, file_path: Optional[str]) -> Tuple[bool, Any]:
+        """Run one backend call and record its outcome; returns (backend failed, result or error)"""
+        health = self.health[backend.name]
+        started = time.perf_counter()
+        try:
+            result = backend.call(prompt, file_path)
+        except BACKEND_FAILURES as e:
+            health.record_failure()
+            self.logger.warning(f"{self.name}: backend {backend.name} failed ({health.state}): {str(e)[:200]}")
+            return True, f"Error in {backend.name}: {str(e)}"
+        except Exception as e:
+            # A problem with the request, not the backend
+            health.release()
+            return False, f"Error in {backend.name}: {str(e)}"
+        health.record_success(time.perf_counter() - started)
+        return False, result
+
+    def call(self, prompt: str, file_path: Optional[str] = None, content_type: str = 'text/plain',
+             hedge: Optional[bool] = None) -> Any:
+        """
+        Serve a request from the backends, in order of preference.
+
+        Returns the first result that is not a backend failure, or the last error
+        string when every capable backend failed or had its circuit open.
+        hedge=False turns hedging off for this request (e.g. for slow uploads).
+        """
+        hedge = self.hedge and hedge is not False
+        candidates = iter([b for b in self.backends if b.supports(prompt, content_type)])
+        pending = {}
+        last_error = f"Error in {self.name}: no available backend for {content_type}"
+        hedged = False
+
+        def launch_next() -> bool:
+            for backend in candidates:
+                if self.health[backend.name].allow():
+                    # Copy the context so usage accounting follows the request into the pool thread
+                    context = contextvars.copy_context()
+                    future = self._executor.submit(context.run, self._timed, backend, prompt, file_path)
+                    pending[future] = (backend, time.perf_counter())
+                    return True
+            return False
+
+        launch_next()
+        while pending:
+            timeout = None
+            if hedge and not hedged and len(pending) == 1:
+                backend, started = next(iter(pending.values()))
+                p95 = self.health[backend.name].percentile(HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES)
+                if p95 is not None:
+                    timeout = max(0.0, p95 - (time.perf_counter() - started))
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Slower than its p95: race the next backend against it
+                hedged = True
+                if launch_next():
+                    self.logger.info(f"{self.name}: hedging slow {backend.name} request")
+                continue
+
+            for future in done:
+                backend, _ = pending.pop(future)
+                failed, result = future.result()
+                if not failed:
+                    if backend is not self.backends[0]:
+                        self.logger.info(f"{self.name}: served by fallback backend {backend.name}")
+                    return result
+                last_error = result
+            if not pending:
+                launch_next()
+        return last_error
+
+    def status(self) -> Dict[str, Dict]:
+        """Health snapshot per backend, e.g. for a status page"""
+        return {name: health.snapshot() for name, health in self.health.items()}
@@ -0,0 +1,257 @@
+# history.py
+import csv
+import glob
+import gzip
+import io
+import json
+import os
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from utils.logger import enhanced_logger
+from tools.results import truncate_strings
+from config.config import TOOL_RESULT_LIMITS, HISTORY_CACHE_SIZE
+
+# What reading a damaged archive raises: a truncated gzip ends in EOFError, a corrupt one in zlib.error
+READ_ERRORS = (OSError, EOFError, zlib.error)
+
+def scan_rows(lines: Iterable[bytes], base: int = 0) -> Iterator[Tuple[int, int, List[str]]]:
+    """(byte offset, byte length, fields) of each complete CSV row in lines, which start at byte base"""
+    consumed = base
+
+    def decoded():
+        nonlocal consumed
+        for line in lines:
+            consumed += len(line)
+            yield line.decode('utf-8', errors='replace')
+
+    start = base
+    try:
+        # csv.reader pulls exactly the lines of one row before yielding it, so consumed ends that row
+        for fields in csv.reader(decoded()):
+            yield start, consumed - start, fields
+            start = consumed
+    except csv.Error:
+        # A row cut off at the end of the data
+        return
+
+class _Segment:
+    """
+    Index of one CSV file: its headers, and per row the byte span plus the small
+    columns the filters need, as (offset, length, day, tool_name, file_type, user_query).
+    """
+    __slots__ = ('path', 'headers', 'rows', 'end', 'inode')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.headers: Optional[List[str]] = None
+        self.rows: List[Tuple] = []
+        self.end = 0
+        self.inode = None
+
+class ConversationHistory:
+    """
+    Paged, filterable view over the conversation log, shared by all sessions.
+
+    Only the small columns of each row and its byte span are kept in memory; the
+    full row is read back from its file when it is shown, and prepared entries are
+    cached up to cache_size. The live CSV is read incrementally, and rotated
+    segments in the archive are indexed the first time paging reaches them, so
+    history reaches past rotations. Months compacted to Parquet are left to the
+    analytics page.
+    """
+
+    def __init__(self, logger=enhanced_logger, cache_size: int = HISTORY_CACHE_SIZE):
+        self.logger = logger
+        self.cache_size = cache_size
+        self.tool_names = set()
+        self.file_types = set()
+        # Bumped whenever the live log is replaced (e.g. rotated), so stale page cursors can be dropped
+        self.generation = 0
+        self._live = _Segment(logger.csv_path)
+        # Archived segments, oldest first; None until paging first reaches them
+        self._archives: Dict[str, Optional[_Segment]] = {}
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _scan_archives(self):
+        """Pick up rotated segments and forget the ones removed by retention or compaction"""
+        paths = sorted(glob.glob(os.path.join(self.logger.archive_dir, 'conversation_*.csv.gz')))
+        self._archives = {path: self._archives.get(path) for path in paths}
+
+    def _index(self, segment: _Segment, lines: Iterable[bytes], base: int) -> int:
+        """Add the rows in lines to segment and return how many were added"""
+        added = 0
+        columns = None
+        for offset, length, fields in scan_rows(lines, base):
+            segment.end = offset + length
+            if segment.headers is None:
+                segment.headers = fields
+                continue
+            if columns is None:
+                columns = [segment.headers.index(name) if name in segment.headers else None
+                           for name in ('timestamp', 'tool_name', 'file_type', 'user_query')]
+            timestamp, tool_name, file_type, user_query = [
+                fields[index] if index is not None and index < len(fields) else '' for index in columns
+            ]
+            # Days, tool names and file types repeat across rows, so share one copy of each
+            row = (offset, length, sys.intern(timestamp[:10]), sys.intern(tool_name), sys.intern(file_type), user_query)
+            segment.rows.append(row)
+            self.tool_names.update(name.strip() for name in tool_name.split(',') if name.strip())
+            if file_type:
+                self.file_types.add(file_type)
+            added += 1
+        return added
+
+    def _archive(self, path: str) -> Optional[_Segment]:
+        """The index of an archived segment, built on first use"""
+        segment = self._archives.get(path)
+        if segment is None and path in self._archives:
+            segment = _Segment(path)
+            try:
+                with gzip.open(path, 'rb') as f:
+                    self._index(segment, f, 0)
+            except READ_ERRORS as e:
+                self.logger.logger.error(f"Error reading archived conversations {path}: {str(e)}")
+                segment.rows = []
+            self._archives[path] = segment
+        return segment
+
+    def refresh(self) -> int:
+        """Pull in rows appended to the live log since the last refresh and return how many were added"""
+        with self._lock:
+            live = self._live
+            try:
+                stat = os.stat(live.path)
+            except FileNotFoundError:
+                stat = None
+
+            if stat is None or (live.inode is not None and (live.inode != stat.st_ino or stat.st_size < live.end)):
+                if live.inode is not None:
+                    # Rotated or cleared: its rows now live in the archive, if anywhere
+                    self.generation += 1
+                    self._entries = OrderedDict((key, entry) for key, entry in self._entries.items() if key[0] != live.path)
+                self._live = live = _Segment(live.path)
+            # Cheap (a directory listing); the logger swaps each segment in under its final name once fully compressed
+            self._scan_archives()
+            if stat is None:
+                return 0
+
+            live.inode = stat.st_ino
+            try:
+                with open(live.path, 'rb') as f:
+                    f.seek(live.end)
+                    data = f.read()
+            except OSError as e:
+                self.logger.logger.error(f"Error reading new conversations: {str(e)}")
+                return 0
+            # Only consume complete rows (csv rows end with \r\n, fields may contain \n)
+            end = data.rfind(b'\r\n')
+            data = data[:end + 2] if end >= 0 else b''
+            return self._index(live, io.BytesIO(data), live.end)
+
+    def _matches(self, row: Tuple, tool_name: str, file_type: str,
+                 start_date: Optional[date], end_date: Optional[date], search: str) -> bool:
+        _, _, day, row_tool_name, row_file_type, user_query = row
+        if tool_name and tool_name not in [name.strip() for name in row_tool_name.split(',')]:
+            return False
+        if file_type and row_file_type != file_type:
+            return False
+        if start_date and day < start_date.isoformat():
+            return False
+        if end_date and day > end_date.isoformat():
+            return False
+        if search and search.lower() not in user_query.lower():
+            return False
+        return True
+
+    def page(self,
+             before: Optional[Tuple[str, int]] = None,
+             limit: int = 5,
+             tool_name: str = None,
+             file_type: str = None,
+             start_date: Optional[date] = None,
+             end_date: Optional[date] = None,
+             search: str = None) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """
+        Return up to limit matching entries, newest first, older than the before cursor.
+
+        Paging continues from the live log into the archived segments. The returned
+        cursor fetches the next (older) page, or is None when there is none.
+        """
+        with self._lock:
+            paths = [*self._archives, self._live.path]
+            if before is None:
+                position, index = len(paths) - 1, None
+            elif before[0] in paths:
+                position, index = paths.index(before[0]), before[1]
+            else:
+                return [], None
+
+            matches = []
+            while True:
+                segment = self._live if position == len(paths) - 1 else self._archive(paths[position])
+                index = len(segment.rows) if index is None else min(index, len(segment.rows))
+                while index > 0 and len(matches) < limit:
+                    index -= 1
+                    if self._matches(segment.rows[index], tool_name, file_type, start_date, end_date, search):
+                        matches.append((segment, index))
+                if len(matches) == limit or position == 0:
+                    break
+                position, index = position - 1, None
+
+            next_cursor = (paths[position], index) if len(matches) == limit and (index > 0 or position > 0) else None
+            return self._load(matches), next_cursor
+
+    def _load(self, matches: List[Tuple[_Segment, int]]) -> List[Dict]:
+        """Prepared entries for matches, reading each file once for the rows that are not cached"""
+        missing: Dict[str, List[Tuple]] = {}
+        for segment, index in matches:
+            offset, length = segment.rows[index][:2]
+            if (segment.path, offset) not in self._entries:
+                missing.setdefault(segment.path, []).append((offset, length, segment.headers))
+
+        for path, rows in missing.items():
+            try:
+                # In offset order, so a gzip segment is decompressed in a single pass
+                with (gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')) as f:
+                    for offset, length, headers in sorted(rows):
+                        f.seek(offset)
+                        fields = next(csv.reader(io.StringIO(f.read(length).decode('utf-8', errors='replace'), newline='')), [])
+                        self._store((path, offset), self._prepare(dict(zip(headers, fields))))
+            except READ_ERRORS as e:
+                self.logger.logger.error(f"Error reading conversations from {path}: {str(e)}")
+
+        entries = []
+        for segment, index in matches:
+            entry = self._entries.get((segment.path, segment.rows[index][0]))
+            if entry is not None:
+                self._entries.move_to_end((segment.path, segment.rows[index][0]))
+                entries.append(entry)
+        return entries
+
+    def _store(self, key: Tuple[str, int], entry: Dict):
+        self._entries[key] = entry
+        while len(self._entries) > self.cache_size:
+            self._entries.popitem(last=False)
+
+    def _prepare(self, entry: Dict) -> Dict:
+        """Parse the JSON columns of a row and cut it down for display"""
+        for key in ['tool_arguments', 'tool_response']:
+            if entry.get(key):
+                try:
+                    entry[key] = json.loads(entry[key])
+                except ValueError:
+                    pass
+        # Long tool outputs are cut to the UI limit once here rather than on every render
+        entry['tool_response'] = truncate_strings(entry.get('tool_response'), TOOL_RESULT_LIMITS['ui'])
+        arguments = entry.get('tool_arguments')
+        if isinstance(arguments, dict) and arguments.get('file_path'):
+            arguments['file_path'] = f"...{os.path.basename(arguments['file_path'])}"
+        return entry
+
+# Create singleton instance (shared by all sessions, which only keep their page cursors)
+conversation_history = ConversationHistory()
@@ -0,0 +1,140 @@
+# image_prep.py
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+from PIL import Image, ImageOps
+from config.config import IMAGE_VARIANTS, IMAGE_CACHE_SIZE, IMAGE_BASE_CACHE_SIZE
+
+class ImagePreparer:
+    """
+    Decodes uploaded images once and produces model-specific resized variants.
+
+    Each image is decoded once per content hash into an RGB base image, from which
+    the classifier and Gemini variants are resized, so the file is never decoded
+    twice. JPEGs are decoded at the reduced scale (draft mode) that still covers
+    every configured variant; variants are shrunk with a fast integer reduce
+    before the final high-quality resize and cached by content hash and options.
+    """
+
+    def __init__(self, variants: Dict[str, Dict], cache_size: int, base_cache_size: int = IMAGE_BASE_CACHE_SIZE):
+        self.variants = variants
+        self.cache_size = cache_size
+        self.base_cache_size = base_cache_size
+        self._bases = OrderedDict()
+        self._images = OrderedDict()
+        self._encoded = OrderedDict()
+        self._hashes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def content_hash(self, file_path: str) -> str:
+        """Hash of the file contents, remembered per (path, size, mtime)"""
+        stat = os.stat(file_path)
+        key = (str(file_path), stat.st_size, stat.st_mtime_ns)
+        digest = self._cached(self._hashes, key)
+        if digest is None:
+            hasher = hashlib.blake2b(digest_size=16)
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+            # Every upload gets a new temp path, so this is bounded like the image caches
+            self._store(self._hashes, key, digest)
+        return digest
+
+    def _options(self, variant: str, overrides: Dict) -> Dict:
+        if variant not in self.variants:
+            raise ValueError(f"Unknown image variant: {variant}")
+        return {**self.variants[variant], **overrides}
+
+    def _cached(self, cache: OrderedDict, key):
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _store(self, cache: OrderedDict, key, value, size: int = None):
+        with self._lock:
+            cache[key] = value
+            while len(cache) > (size or self.cache_size):
+                cache.popitem(last=False)
+
+    def _target_size(self, width: int, height: int, options: Dict) -> Tuple[int, int]:
+        if options.get('max_side'):
+            scale = min(1.0, options['max_side'] / max(width, height))
+        elif options.get('min_side'):
+            scale = min(1.0, options['min_side'] / min(width, height))
+        else:
+            scale = 1.0
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def _base(self, file_path: str, options: Dict) -> Tuple[Image.Image, Tuple[int, int]]:
+        """The decoded, EXIF-transposed RGB image and the full-resolution size it stands for"""
+        digest = self.content_hash(file_path)
+        cached = self._cached(self._bases, digest)
+        if cached is not None:
+            image, full_size = cached
+            # A draft-scaled base may be too small for options beyond the configured variants
+            target = self._target_size(*full_size, options)
+            if image.size == full_size or (image.width >= target[0] and image.height >= target[1]):
+                return cached
+
+        image = Image.open(file_path)
+        size = image.size
+        # JPEG: let the decoder scale down by 1/2, 1/4 or 1/8, as far as the largest variant allows
+        targets = [self._target_size(*size, variant) for variant in [*self.variants.values(), options]]
+        image.draft('RGB', (max(width for width, _ in targets), max(height for _, height in targets)))
+        orientation = image.getexif().get(0x0112, 1)
+        image = ImageOps.exif_transpose(image)
+        full_size = size[::-1] if orientation in (5, 6, 7, 8) else size
+
+        # Normalize color mode, flattening transparency onto white
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.load()
+
+        self._store(self._bases, digest, (image, full_size), self.base_cache_size)
+        return image, full_size
+
+    def _resize(self, image: Image.Image, full_size: Tuple[int, int], options: Dict) -> Image.Image:
+        target = self._target_size(*full_size, options)
+        factor = min(image.width // target[0], image.height // target[1])
+        if factor >= 2:
+            image = image.reduce(factor)
+        if image.size != target:
+            image = image.resize(target, Image.LANCZOS)
+        return image
+
+    def prepare(self, file_path: str, variant: str, **overrides) -> Image.Image:
+        """Return the RGB image resized for variant (e.g. 'classifier' or 'gemini')"""
+        options = self._options(variant, overrides)
+        key = (self.content_hash(file_path), tuple(sorted(options.items())))
+        image = self._cached(self._images, key)
+        if image is None:
+            image = self._resize(*self._base(file_path, options), options)
+            self._store(self._images, key, image)
+        return image
+
+    def prepare_bytes(self, file_path: str, variant: str, **overrides) -> Tuple[bytes, str]:
+        """Return the variant encoded in its configured format, with its MIME type"""
+        options = self._options(variant, overrides)
+        key = (self.content_hash(file_path), tuple(sorted(options.items())))
+        encoded = self._cached(self._encoded, key)
+        if encoded is None:
+            image_format = options.get('format', 'PNG')
+            buffer = io.BytesIO()
+            self.prepare(file_path, variant, **overrides).save(buffer, format=image_format, quality=options.get('quality', 90))
+            encoded = (buffer.getvalue(), Image.MIME[image_format])
+            self._store(self._encoded, key, encoded)
+        return encoded
+
+# Create singleton instance
+image_preparer = ImagePreparer(IMAGE_VARIANTS, IMAGE_CACHE_SIZE)
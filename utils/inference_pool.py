@@ -0,0 +1,107 @@
+# inference_pool.py
+import importlib
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, List
+from config.config import (
+    USE_INFERENCE_POOL,
+    INFERENCE_WORKERS,
+    INFERENCE_THREADS_PER_WORKER,
+    INFERENCE_PRELOAD
+)
+
+# Set by _init_worker: only pool workers count, not every child process (e.g. load-test users)
+_in_worker = False
+
+def in_inference_worker() -> bool:
+    """Whether this process is an inference pool worker"""
+    return _in_worker
+
+def _resolve(entry_point: str):
+    module_name, function_name = entry_point.split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+def _init_worker(threads: int, preload: List[str]):
+    """Pin torch threads and load the models once when a worker process starts"""
+    global _in_worker
+    _in_worker = True
+    # Spawn re-imports the parent's main module (e.g. main.py), which may already have set up the logger
+    if 'utils.logger' in sys.modules:
+        sys.modules['utils.logger'].enhanced_logger.use_console_only()
+
+    # Must be set before torch is imported so OpenMP/MKL size their thread pools accordingly
+    for variable in ['OMP_NUM_THREADS', 'MKL_NUM_THREADS']:
+        os.environ[variable] = str(threads)
+
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    for entry_point in preload:
+        try:
+            _resolve(entry_point)()
+        except Exception as e:
+            print(f"Inference worker {os.getpid()}: could not preload {entry_point}: {str(e)}")
+
+def _invoke(entry_point: str, args: tuple, kwargs: dict) -> Any:
+    return _resolve(entry_point)(*args, **kwargs)
+
+class InferencePool:
+    """
+    Runs local model inference in separate worker processes.
+
+    Each worker pins its torch thread count so the pool uses every core without
+    oversubscribing, and a crash or OOM in a model only takes down its worker.
+    """
+
+    def __init__(self, workers: int, threads_per_worker: int = 0, preload: List[str] = None):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.preload = preload or []
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # spawn, not fork: forking a process that already runs torch or Streamlit threads is unsafe
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.threads_per_worker, self.preload)
+                )
+            return self._executor
+
+    def run(self, entry_point: str, *args, **kwargs) -> Any:
+        """Call the function at entry_point ("module:function") in a worker and wait for the result"""
+        executor = self._get_executor()
+        try:
+            return executor.submit(_invoke, entry_point, args, kwargs).result()
+        except BrokenProcessPool:
+            # A worker died (crash or OOM): replace the pool so later requests still work
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise RuntimeError(f"Inference worker crashed while running {entry_point}")
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+# Create singleton instance
+inference_pool = InferencePool(INFERENCE_WORKERS, INFERENCE_THREADS_PER_WORKER, INFERENCE_PRELOAD)
+
+def run_model(entry_point: str, *args, **kwargs) -> Any:
+    """Run a local model function in the worker pool, or in-process when the pool is disabled"""
+    # Workers always run in-process, so a model call never re-enters the pool
+    if USE_INFERENCE_POOL and not _in_worker:
+        return inference_pool.run(entry_point, *args, **kwargs)
+    return _resolve(entry_point)(*args, **kwargs)
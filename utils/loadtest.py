@@ -0,0 +1,459 @@
+# loadtest.py
+"""
+Load test of the agent with concurrent simulated users against stub backends.
+
+OpenAI is replaced by a local HTTP server speaking the chat completions API
+(the client is pointed at it through OPENAI_BASE_URL) and the pooled Gemini
+agents by stand-ins; both add configurable latency and errors. Each simulated
+user has its own AIAgent, as each Streamlit session does, and replays queries
+sampled from the conversation log. With --app the users drive app.py through
+Streamlit's AppTest script runner instead.
+
+The run happens in a scratch directory so its logs do not mix with real ones.
+
+Usage:
+    python -m utils.loadtest [--users 1 2 4 8] [--duration 20] [--app] [--stub-local]
+"""
+import argparse
+import dataclasses
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TASKS_DIR = os.path.join(REPO_ROOT, 'Tasks')
+
+# Used when the conversation log is empty: (query, file extension, tools GPT-4o would pick)
+DEFAULT_QUERY_MIX = [
+    ("What is the sentiment of: I really enjoyed the product and delivery was quick", None, ["analyze_sentiment"]),
+    ("Translate to french: Good morning, the meeting is moved to Tuesday", None, ["analyze_multimodal_content"]),
+    ("Classify this image", ".jpg", ["analyze_multimodal_content"]),
+    ("Describe what is happening in this image", ".png", ["process_with_gemini"]),
+    ("Summarize this document", ".pdf", ["process_with_gemini"]),
+    ("Transcribe this audio", ".mp3", ["process_with_gemini"]),
+    ("What can you help me with?", None, [])
+]
+
+class StubBehaviour:
+    """Latency (log-normal around a median) and error injection for a stub backend"""
+
+    def __init__(self, latency_ms: float, error_rate: float, jitter: float = 0.5):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.jitter = jitter
+
+    def delay(self) -> bool:
+        """Sleep for one call's latency; returns True when this call should fail"""
+        time.sleep(self.latency_ms * random.lognormvariate(0, self.jitter) / 1000)
+        return random.random() < self.error_rate
+
+def _sample_file(extension: str) -> Optional[str]:
+    """A file from Tasks/ with the given extension, standing in for uploads that no longer exist"""
+    if not extension:
+        return None
+    # Directories can match too (e.g. Tasks/Audio for an empty pattern), so keep only files
+    matches = sorted(path for path in glob.glob(os.path.join(TASKS_DIR, '**', f'*{extension}'), recursive=True)
+                     if os.path.isfile(path))
+    return matches[0] if matches else None
+
+def load_query_mix(csv_path: str) -> List[Dict]:
+    """Queries, attached files and chosen tools from the conversation log, or a default mix"""
+    mix = []
+    if os.path.exists(csv_path):
+        import pandas as pd
+        df = pd.read_csv(csv_path, usecols=['user_query', 'file_path', 'tool_name'], encoding='utf-8')
+        for row in df.dropna(subset=['user_query']).itertuples(index=False):
+            file_path = row.file_path if isinstance(row.file_path, str) else None
+            if file_path and not os.path.isfile(file_path):
+                # Uploads were temp files; replay with a sample of the same type, or skip the
+                # row when there is none (e.g. an upload saved without an extension)
+                file_path = _sample_file(os.path.splitext(file_path)[1])
+                if not file_path:
+                    continue
+            tools = [name.strip() for name in row.tool_name.split(',')] if isinstance(row.tool_name, str) else []
+            mix.append({'query': row.user_query, 'file_path': file_path, 'tools': tools})
+
+    if not mix:
+        for query, extension, tools in DEFAULT_QUERY_MIX:
+            file_path = _sample_file(extension) if extension else None
+            if extension and not file_path:
+                continue
+            mix.append({'query': query, 'file_path': file_path, 'tools': tools})
+    return mix
+
+class _OpenAIStubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.server.behaviour.delay():
+            self._send(500, {"error": {"message": "Injected stub error", "type": "server_error"}})
+            return
+        self._send(200, self.server.completion(body))
+
+    def _send(self, status: int, payload: Dict):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # One line per request would drown the report
+        pass
+
+class OpenAIStubServer(ThreadingHTTPServer):
+    """Chat completions endpoint that picks the tools recorded for each query"""
+    daemon_threads = True
+
+    def __init__(self, mix: List[Dict], behaviour: StubBehaviour):
+        super().__init__(('127.0.0.1', 0), _OpenAIStubHandler)
+        self.behaviour = behaviour
+        self.routes = {item['query']: item['tools'] for item in mix}
+        self._ids = iter(range(1, 1 << 62))
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def completion(self, body: Dict) -> Dict:
+        message = {"role": "assistant", "content": "Stub summary of the tool results."}
+        schemas = {tool['function']['name']: tool['function'] for tool in body.get('tools') or []}
+        if schemas:
+            query = next((m['content'] for m in body['messages'] if m['role'] == 'user'), '')
+            calls = []
+            for name in self.routes.get(query, []):
+                if name in schemas:
+                    # Put the query in the tool's text or prompt parameter (schema keys are sorted)
+                    properties = schemas[name]['parameters'].get('properties', {})
+                    parameter = next((key for key in ('text', 'prompt') if key in properties), 'text')
+                    calls.append({
+                        "id": f"call_{next(self._ids)}",
+                        "type": "function",
+                        "function": {"name": name, "arguments": json.dumps({parameter: query})}
+                    })
+            if calls:
+                message = {"role": "assistant", "content": None, "tool_calls": calls}
+            else:
+                message["content"] = "Stub direct answer."
+
+        prompt_tokens = len(json.dumps(body)) // 4
+        completion_tokens = len(json.dumps(message)) // 4
+        return {
+            "id": f"chatcmpl-{next(self._ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model', 'gpt-4o'),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0}
+            }
+        }
+
+def install_gemini_stub(behaviour: StubBehaviour):
+    """Replace the pooled Gemini agents with stand-ins that never call the API"""
+    from tools.gemini_tool import UnifiedGeminiAgent, register_gemini_agent
+    from utils.usage import usage_tracker
+    from config.config import GEMINI_MODEL_ID, GEMINI_FALLBACK_MODELS
+
+    class StubGeminiAgent(UnifiedGeminiAgent):
+        def _generate(self, stage: str, contents):
+            if behaviour.delay():
+                # Shaped like a transport failure so the failover router counts it against the backend
+                raise ConnectionError("Injected stub error")
+            parts = contents if isinstance(contents, list) else [contents]
+            # Roughly 4 characters per token, and a flat 258 tokens per image or file
+            prompt_tokens = sum(len(part) // 4 if isinstance(part, str) else 258 for part in parts)
+            response = SimpleNamespace(
+                text=f"Stub {self.model_id} answer.",
+                usage_metadata=SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=40, cached_content_token_count=0)
+            )
+            usage_tracker.record_gemini(stage, self.model_id, response)
+            return response
+
+        def _send_upload(self, file_path):
+            time.sleep(behaviour.latency_ms / 4000)
+            return SimpleNamespace(name=f"files/{os.path.basename(str(file_path))}", state=SimpleNamespace(name="ACTIVE"))
+
+    for model_id in [GEMINI_MODEL_ID] + GEMINI_FALLBACK_MODELS:
+        register_gemini_agent(StubGeminiAgent(model_id))
+
+_local_behaviour = StubBehaviour(150, 0.0, jitter=0.3)
+
+def stub_local_tool(**kwargs) -> Dict:
+    """Stand-in for the local model tools, for hosts without the model weights"""
+    if _local_behaviour.delay():
+        raise RuntimeError("Injected stub error")
+    return {"stub": True, "arguments": sorted(kwargs)}
+
+def install_local_stub(behaviour: StubBehaviour):
+    """Route the local sentiment, classification and translation tools to stub_local_tool"""
+    global _local_behaviour
+    from tools.registry import registry
+    from tools.gemini_tool import gemini_router
+    from config.config import TOOL_MODULES
+
+    _local_behaviour = behaviour
+    registry.load_modules(TOOL_MODULES)
+    for name in ['analyze_sentiment', 'analyze_multimodal_content']:
+        registry.register(dataclasses.replace(registry.get(name), entry_point=f"{__name__}:stub_local_tool"))
+    for backend in gemini_router.backends:
+        if backend.name == "local":
+            backend.call = lambda prompt, file_path: json.dumps(stub_local_tool(prompt=prompt))
+
+def quiet_console():
+    """Keep INFO lines on the console from interleaving with the report (the log file still gets them)"""
+    import logging
+    from utils.logger import enhanced_logger
+    for handler in logging.getLogger().handlers:
+        if type(handler) is logging.StreamHandler:
+            handler.setLevel(logging.WARNING)
+
+def disable_budgets():
+    """Token budgets would start refusing queries part-way through a run"""
+    import utils.usage as usage
+    usage.SESSION_TOKEN_BUDGET = 0
+    usage.DAILY_TOKEN_BUDGET = 0
+
+def agent_session() -> Callable[[str, Optional[str]], str]:
+    """One simulated user calling AIAgent.process_query directly"""
+    from main import AIAgent
+    agent = AIAgent()
+
+    def send(query: str, file_path: Optional[str]) -> str:
+        return agent.process_query(f"file: {file_path} | query: {query}" if file_path else query)
+    return send
+
+def app_session(timeout: float) -> Callable[[str, Optional[str]], str]:
+    """One simulated user typing into app.py, run by Streamlit's AppTest script runner"""
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(os.path.join(REPO_ROOT, 'app.py'), default_timeout=timeout)
+    app.run()
+
+    def send(query: str, file_path: Optional[str]) -> str:
+        # Stands in for an upload: the app only keeps the temp file path in session state
+        if file_path:
+            app.session_state['current_file'] = file_path
+        elif 'current_file' in app.session_state:
+            del app.session_state['current_file']
+        app.chat_input[0].set_value(query).run()
+        if app.exception:
+            return f"Error: {app.exception[0].message}"
+        messages = app.session_state['messages']
+        if not messages or messages[-1]['role'] != 'assistant':
+            return "Error: no response rendered"
+        return messages[-1]['content']
+    return send
+
+def _proc_status(pid='self') -> Tuple[float, int]:
+    """Resident memory (MB) and thread count of a process, from /proc"""
+    rss_mb, threads = 0.0, 0
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss_mb = int(line.split()[1]) / 1024
+                elif line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+    except OSError:
+        # No /proc (e.g. macOS) or the process has exited
+        pass
+    return rss_mb, threads
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))]
+
+def setup_process(options: Dict):
+    """Install the stubs in this process (the parent, or a user process in --app mode)"""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    # Keep the run's logs out of logs/: the logger writes relative to the working directory
+    os.chdir(options['scratch'])
+    quiet_console()
+
+    # Set before main is imported: the client refuses an empty key, and the real one is not needed
+    import config.config as config
+    config.OPENAI_API_KEY = "stub-key"
+
+    install_gemini_stub(StubBehaviour(options['gemini_latency_ms'], options['gemini_error_rate']))
+    if options['stub_local']:
+        install_local_stub(StubBehaviour(options['local_latency_ms'], 0.0, jitter=0.3))
+    if not options['keep_budgets']:
+        disable_budgets()
+
+def _user_loop(send: Callable, mix: List[Dict], index: int, deadline: float, think_seconds: float) -> Tuple[List[float], int]:
+    """Send queries from the mix until deadline (time.time()); returns latencies in ms and failure count"""
+    rng = random.Random(index)
+    latencies, failures = [], 0
+    while time.time() < deadline:
+        item = rng.choice(mix)
+        request_started = time.perf_counter()
+        try:
+            response = send(item['query'], item['file_path'])
+            failed = not isinstance(response, str) or response.startswith("Error")
+        except Exception:
+            failed = True
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        failures += failed
+        if think_seconds:
+            time.sleep(rng.expovariate(1 / think_seconds))
+    return latencies, failures
+
+def _app_user(index: int, options: Dict, mix: List[Dict], duration: float, think_seconds: float, barrier, results):
+    """One --app user in its own process: AppTest swaps a global Runtime per script run, so runs cannot share a process"""
+    setup_process(options)
+    send = app_session(options['app_timeout'])
+    barrier.wait()
+    results.put(_user_loop(send, mix, index, time.time() + duration, think_seconds))
+
+def run_level(users: int, duration: float, mix: List[Dict], options: Dict, think_seconds: float = 0.0) -> Dict:
+    """Run users concurrent sessions for duration seconds and summarize latency, errors and resources"""
+    outcomes: List[Tuple[List[float], int]] = []
+    cpu_before = os.times()
+
+    if options['app']:
+        context = multiprocessing.get_context('spawn')
+        barrier = context.Barrier(users + 1)
+        results = context.Queue()
+        workers = [context.Process(target=_app_user, args=(index, options, mix, duration, think_seconds, barrier, results))
+                   for index in range(users)]
+        for worker in workers:
+            worker.start()
+        pids = [worker.pid for worker in workers]
+
+        def collect():
+            # Drain results as they arrive so a finishing process never blocks on a full pipe
+            while True:
+                try:
+                    outcomes.append(results.get_nowait())
+                except queue.Empty:
+                    return
+    else:
+        sessions = [agent_session() for _ in range(users)]
+        barrier = threading.Barrier(users + 1)
+        lock = threading.Lock()
+
+        def user(index: int):
+            barrier.wait()
+            outcome = _user_loop(sessions[index], mix, index, time.time() + duration, think_seconds)
+            with lock:
+                outcomes.append(outcome)
+
+        workers = [threading.Thread(target=user, args=(index,), daemon=True) for index in range(users)]
+        for worker in workers:
+            worker.start()
+        pids = []
+
+        def collect():
+            pass
+
+    # Start the clock once every session is set up
+    barrier.wait()
+    started = time.monotonic()
+    rss_samples, thread_samples = [], []
+    while any(worker.is_alive() for worker in workers):
+        statuses = [_proc_status()] + [_proc_status(pid) for pid in pids]
+        rss_samples.append(sum(rss for rss, _ in statuses))
+        thread_samples.append(sum(threads for _, threads in statuses))
+        collect()
+        time.sleep(0.5)
+    collect()
+    wall = time.monotonic() - started
+    if options['app']:
+        for worker in workers:
+            worker.join()
+    cpu_after = os.times()
+    # User and system time of this process and of exited children (the --app user processes;
+    # inference pool workers are still alive and not included)
+    cpu_seconds = sum(after - before for after, before in zip(cpu_after[:4], cpu_before[:4]))
+
+    ordered = sorted(latency for latencies, _ in outcomes for latency in latencies)
+    failures = sum(failed for _, failed in outcomes)
+    return {
+        'users': users,
+        'requests': len(ordered),
+        'throughput_rps': round(len(ordered) / wall, 2) if wall else 0.0,
+        'p50_ms': round(_percentile(ordered, 50), 1),
+        'p95_ms': round(_percentile(ordered, 95), 1),
+        'p99_ms': round(_percentile(ordered, 99), 1),
+        'max_ms': round(ordered[-1], 1) if ordered else 0.0,
+        'error_rate': round(failures / len(ordered), 4) if ordered else 0.0,
+        'cpu_percent': round(100 * cpu_seconds / wall, 1) if wall else 0.0,
+        'peak_rss_mb': round(max(rss_samples, default=0.0), 1),
+        'peak_threads': max(thread_samples, default=0)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-user load test of the agent against stub backends")
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 2, 4, 8], help="Concurrency levels to run, in order")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds per concurrency level")
+    parser.add_argument('--think', type=float, default=0.0, help="Mean think time between a user's queries (seconds)")
+    parser.add_argument('--queries', default=os.path.join('logs', 'conversation.csv'), help="Conversation log to sample queries from")
+    parser.add_argument('--app', action='store_true', help="Drive app.py through Streamlit's AppTest (one process per user) instead of AIAgent")
+    parser.add_argument('--app-timeout', type=float, default=120, help="Seconds one AppTest script run may take")
+    parser.add_argument('--openai-latency-ms', type=float, default=600)
+    parser.add_argument('--openai-error-rate', type=float, default=0.0)
+    parser.add_argument('--gemini-latency-ms', type=float, default=1500)
+    parser.add_argument('--gemini-error-rate', type=float, default=0.0)
+    parser.add_argument('--stub-local', action='store_true', help="Replace the local model tools with stubs too")
+    parser.add_argument('--local-latency-ms', type=float, default=150)
+    parser.add_argument('--keep-budgets', action='store_true', help="Leave the token budgets on")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    mix = load_query_mix(os.path.abspath(args.queries))
+    json_path = os.path.abspath(args.json) if args.json else None
+    options = {
+        'scratch': tempfile.mkdtemp(prefix='loadtest_'),
+        'app': args.app,
+        'app_timeout': args.app_timeout,
+        'gemini_latency_ms': args.gemini_latency_ms,
+        'gemini_error_rate': args.gemini_error_rate,
+        'stub_local': args.stub_local,
+        'local_latency_ms': args.local_latency_ms,
+        'keep_budgets': args.keep_budgets
+    }
+
+    # One OpenAI stub for every user; --app user processes inherit its URL through the environment
+    server = OpenAIStubServer(mix, StubBehaviour(args.openai_latency_ms, args.openai_error_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+    # An HTTP(S)_PROXY from the environment must not intercept calls to the local stub
+    os.environ['NO_PROXY'] = ",".join(filter(None, [os.environ.get('NO_PROXY'), '127.0.0.1']))
+    setup_process(options)
+
+    print(f"{len(mix)} distinct queries, {'app.py via AppTest' if args.app else 'AIAgent'}, {args.duration:g}s per level")
+    columns = ['users', 'requests', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms',
+               'error_rate', 'cpu_percent', 'peak_rss_mb', 'peak_threads']
+    print("  ".join(f"{column:>14}" for column in columns))
+
+    results = []
+    try:
+        for users in args.users:
+            result = run_level(users, args.duration, mix, options, args.think)
+            results.append(result)
+            print("  ".join(f"{result[column]:>14}" for column in columns), flush=True)
+    finally:
+        server.shutdown()
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(f"Logs of the run: {options['scratch']}")
+
+if __name__ == "__main__":
+    main()
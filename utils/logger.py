@@ -1,131 +1,300 @@
-# logger.py
-import logging
-import os
-from datetime import datetime
-import json
-import csv
-import pandas as pd
-from typing import Dict, Any
-
-class EnhancedLogger:
-    def __init__(self):
-        self.log_dir = 'logs'
-        if not os.path.exists(self.log_dir):
-            os.makedirs(self.log_dir)
-        
-        # Setup logging files with timestamps to prevent conflicts
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        # self.log_filename = f'agent_{timestamp}.log'
-        # self.csv_filename = f'conversation_{timestamp}.csv'
-        self.log_filename = f'agent.log'
-        self.csv_filename = f'conversation.csv'
-        self.log_path = os.path.join(self.log_dir, self.log_filename)
-        self.csv_path = os.path.join(self.log_dir, self.csv_filename)
-        
-        # Configure standard logging with both file and console output
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(self.log_path, encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
-        
-        self.logger = logging.getLogger('ai_agent')
-        
-        # Initialize CSV if it doesn't exist
-        self._initialize_csv()
-        self.logger.info(f"Logger initialized. CSV path: {self.csv_path}")
-
-    def _initialize_csv(self):
-        """Initialize CSV with headers"""
-        try:
-            headers = [
-                'timestamp',
-                'conversation_id',
-                'user_query',
-                'file_path',
-                'file_type',
-                'tool_name',
-                'tool_arguments',
-                'tool_response',
-                'final_response'
-            ]
-            with open(self.csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-            self.logger.info("CSV file initialized successfully")
-        except Exception as e:
-            self.logger.error(f"Error initializing CSV: {str(e)}")
-
-    def log_conversation(self, 
-                        user_query: str,
-                        file_path: str = None,
-                        tool_name: str = None,
-                        tool_args: Dict = None,
-                        tool_response: Any = None,
-                        final_response: str = None,
-                        conversation_id: str = None):
-        """Log a complete conversation entry to CSV"""
-        try:
-            timestamp = datetime.now().isoformat()
-            file_type = os.path.splitext(file_path)[1] if file_path else None
-            
-            # Prepare row data
-            row_data = {
-                'timestamp': timestamp,
-                'conversation_id': conversation_id or datetime.now().strftime("%Y%m%d_%H%M%S"),
-                'user_query': user_query,
-                'file_path': file_path,
-                'file_type': file_type,
-                'tool_name': tool_name,
-                'tool_arguments': json.dumps(tool_args) if tool_args else None,
-                'tool_response': json.dumps(tool_response) if tool_response else None,
-                'final_response': final_response
-            }
-            
-            # Write to CSV
-            with open(self.csv_path, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=row_data.keys())
-                writer.writerow(row_data)
-            
-            # Log success
-            self.logger.info(f"Successfully logged conversation: {json.dumps(row_data)}")
-            return row_data
-            
-        except Exception as e:
-            self.logger.error(f"Error logging conversation: {str(e)}")
-            return None
-
-    def get_recent_conversations(self, limit: int = 5) -> list:
-        """Get recent conversations from CSV"""
-        try:
-            if os.path.exists(self.csv_path):
-                df = pd.read_csv(self.csv_path, encoding='utf-8')
-                if df.empty:
-                    self.logger.info("No conversations found in CSV")
-                    return []
-                conversations = df.tail(limit).to_dict('records')
-                self.logger.info(f"Retrieved {len(conversations)} recent conversations")
-                return conversations
-        except Exception as e:
-            self.logger.error(f"Error reading conversations: {str(e)}")
-        return []
-
-    def clear_logs(self):
-        """Clear both CSV and log file"""
-        try:
-            # Clear log file
-            with open(self.log_path, 'w', encoding='utf-8') as f:
-                f.write('')
-            
-            # Reinitialize CSV
-            self._initialize_csv()
-            
-            self.logger.info("Logs cleared successfully")
-        except Exception as e:
-            self.logger.error(f"Error clearing logs: {str(e)}")
-
-# Create singleton instance
+# logger.py
+import logging
+import os
+import glob
+import gzip
+import shutil
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from datetime import datetime
+import io
+import json
+import csv
+import pandas as pd
+from typing import Dict, Any, List
+from config.config import (
+    LOG_MAX_BYTES,
+    LOG_ROTATE_INTERVAL_HOURS,
+    LOG_BACKUP_COUNT,
+    CSV_MAX_BYTES,
+    CSV_ROTATE_INTERVAL_HOURS,
+    ARCHIVE_RETENTION_DAYS
+)
+from utils.inference_pool import in_inference_worker
+
+CSV_HEADERS = [
+    'timestamp',
+    'conversation_id',
+    'user_query',
+    'file_path',
+    'file_type',
+    'tool_name',
+    'tool_arguments',
+    'tool_response',
+    'final_response',
+    'latency_ms',
+    'tool_latency_ms',
+    'tool_errors',
+    'response_chars',
+    'prompt_tokens',
+    'completion_tokens'
+]
+
+def gzip_file(source: str, dest: str):
+    """Compress source into dest and remove source"""
+    # Readers glob for the final name, so it only appears once the archive is complete
+    tmp_path = dest + '.tmp'
+    with open(source, 'rb') as f_in, gzip.open(tmp_path, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.replace(tmp_path, dest)
+    os.remove(source)
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """Rotate when the file exceeds max_bytes or gets older than interval_seconds, gzipping backups"""
+
+    def __init__(self, filename: str, max_bytes: int, interval_seconds: float, backup_count: int, encoding: str = 'utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.interval_seconds = interval_seconds
+        started = os.path.getmtime(filename) if os.path.exists(filename) else time.time()
+        self.rollover_at = started + interval_seconds
+        # agent.log.1 -> agent.log.1.gz, compressed on rotation
+        self.namer = lambda name: name + '.gz'
+        self.rotator = gzip_file
+
+    def shouldRollover(self, record) -> bool:
+        if self.interval_seconds and time.time() >= self.rollover_at and os.path.getsize(self.baseFilename) > 0:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval_seconds
+
+class EnhancedLogger:
+    def __init__(self):
+        self.log_dir = 'logs'
+        if not os.path.exists(self.log_dir):
+            os.makedirs(self.log_dir)
+        
+        # Setup logging files with timestamps to prevent conflicts
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # self.log_filename = f'agent_{timestamp}.log'
+        # self.csv_filename = f'conversation_{timestamp}.csv'
+        self.log_filename = f'agent.log'
+        self.csv_filename = f'conversation.csv'
+        self.log_path = os.path.join(self.log_dir, self.log_filename)
+        self.csv_path = os.path.join(self.log_dir, self.csv_filename)
+        self.archive_dir = os.path.join(self.log_dir, 'archive')
+        
+        # Inference pool workers only log to the console; the main process
+        # owns the log files and their rotation
+        self.is_worker = in_inference_worker()
+        handlers = [logging.StreamHandler()]
+        if not self.is_worker:
+            handlers.insert(0, SizeAndTimeRotatingFileHandler(
+                self.log_path,
+                max_bytes=LOG_MAX_BYTES,
+                interval_seconds=LOG_ROTATE_INTERVAL_HOURS * 3600,
+                backup_count=LOG_BACKUP_COUNT
+            ))
+
+        # Configure standard logging with both file and console output
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            handlers=handlers
+        )
+        
+        self.logger = logging.getLogger('ai_agent')
+        
+        # Streamlit sessions log from their own threads: the rotation check, the
+        # rotation and the append must not interleave, or rows are lost
+        self._csv_lock = threading.Lock()
+
+        # Initialize CSV if it doesn't exist, keeping the history from earlier runs
+        self._csv_started_at = time.time()
+        if not self.is_worker:
+            self._initialize_csv()
+            self._compress_leftover_segments()
+        self.logger.info(f"Logger initialized. CSV path: {self.csv_path}")
+
+    def use_console_only(self):
+        """Leave the log files to the main process, for a process that became an inference worker"""
+        self.is_worker = True
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, RotatingFileHandler):
+                root.removeHandler(handler)
+                handler.close()
+
+    def _initialize_csv(self):
+        """Create the CSV if needed, appending to an existing one with matching headers"""
+        try:
+            if os.path.exists(self.csv_path) and os.path.getsize(self.csv_path) > 0:
+                with open(self.csv_path, newline='', encoding='utf-8') as f:
+                    reader = csv.reader(f)
+                    headers = next(reader, [])
+                    first_row = next(reader, None)
+                if headers == CSV_HEADERS:
+                    if first_row:
+                        try:
+                            self._csv_started_at = datetime.fromisoformat(first_row[0]).timestamp()
+                        except ValueError:
+                            pass
+                    self.logger.info("Appending to existing CSV file")
+                    return
+                # Columns changed: archive the old file rather than mixing layouts
+                self._archive_segment(self._rotate_csv())
+                return
+            self._write_csv_headers()
+            self.logger.info("CSV file initialized successfully")
+        except Exception as e:
+            self.logger.error(f"Error initializing CSV: {str(e)}")
+
+    def _compress_leftover_segments(self):
+        """Compress segments left uncompressed when an earlier process stopped mid-rotation"""
+        try:
+            segments = sorted(glob.glob(os.path.join(self.archive_dir, 'conversation_*.csv')))
+            for segment in segments:
+                gzip_file(segment, segment + '.gz')
+                self.logger.info(f"Compressed leftover conversation segment {segment}")
+            if segments:
+                self._apply_retention()
+        except Exception as e:
+            self.logger.error(f"Error compressing leftover segments: {str(e)}")
+
+    def _write_csv_headers(self):
+        """Start a new, empty CSV segment"""
+        with open(self.csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADERS)
+        self._csv_started_at = time.time()
+
+    def _should_rotate_csv(self) -> bool:
+        if not os.path.exists(self.csv_path):
+            return False
+        if CSV_MAX_BYTES and os.path.getsize(self.csv_path) >= CSV_MAX_BYTES:
+            return True
+        return bool(CSV_ROTATE_INTERVAL_HOURS) and time.time() - self._csv_started_at >= CSV_ROTATE_INTERVAL_HOURS * 3600
+
+    def _rotate_csv(self) -> str:
+        """Move the current CSV into the archive directory and start a new one; returns the moved segment"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        segment = os.path.join(self.archive_dir, f"conversation_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.csv")
+        os.replace(self.csv_path, segment)
+        self._write_csv_headers()
+        return segment
+
+    def _archive_segment(self, segment: str):
+        """Compress a rotated segment and apply the retention period"""
+        gzip_file(segment, segment + '.gz')
+        self.logger.info(f"Rotated conversation log to {segment}.gz")
+        self._apply_retention()
+
+    def _apply_retention(self):
+        """Delete archived segments older than the retention period"""
+        if not ARCHIVE_RETENTION_DAYS:
+            return
+        cutoff = time.time() - ARCHIVE_RETENTION_DAYS * 86400
+        for path in glob.glob(os.path.join(self.archive_dir, 'conversation*')):
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                self.logger.info(f"Removed expired archive {path}")
+
+    def log_conversation(self, 
+                        user_query: str,
+                        file_path: str = None,
+                        tool_name: str = None,
+                        tool_args: Dict = None,
+                        tool_response: Any = None,  # JSON string, or a value to encode
+                        final_response: str = None,
+                        conversation_id: str = None,
+                        latency_ms: float = None,
+                        tool_latency_ms: Dict[str, float] = None,
+                        tool_errors: List[str] = None,
+                        prompt_tokens: int = None,
+                        completion_tokens: int = None):
+        """Log a complete conversation entry to CSV"""
+        try:
+            timestamp = datetime.now().isoformat()
+            file_type = os.path.splitext(file_path)[1] if file_path else None
+            
+            # Prepare row data
+            row_data = {
+                'timestamp': timestamp,
+                'conversation_id': conversation_id or datetime.now().strftime("%Y%m%d_%H%M%S"),
+                'user_query': user_query,
+                'file_path': file_path,
+                'file_type': file_type,
+                'tool_name': tool_name,
+                'tool_arguments': json.dumps(tool_args) if tool_args else None,
+                # Callers pass tool results already serialized, so they are not encoded twice
+                'tool_response': (tool_response if isinstance(tool_response, str) else json.dumps(tool_response)) if tool_response else None,
+                'final_response': final_response,
+                'latency_ms': round(latency_ms, 1) if latency_ms is not None else None,
+                'tool_latency_ms': json.dumps(tool_latency_ms) if tool_latency_ms else None,
+                'tool_errors': json.dumps(tool_errors) if tool_errors else None,
+                'response_chars': len(final_response) if final_response else 0,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens
+            }
+            
+            # Write to CSV in a single write so readers tailing the file never see half a row
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=row_data.keys())
+            writer.writerow(row_data)
+
+            segment = None
+            with self._csv_lock:
+                if self._should_rotate_csv():
+                    segment = self._rotate_csv()
+                with open(self.csv_path, 'a', newline='', encoding='utf-8') as f:
+                    f.write(buffer.getvalue())
+            # Compress outside the lock so other sessions can keep logging meanwhile
+            if segment:
+                self._archive_segment(segment)
+            
+            # Log success, keeping the full payload out of the INFO lines
+            self.logger.info(f"Successfully logged conversation {row_data['conversation_id']} "
+                             f"(tool: {tool_name}, {len(buffer.getvalue())} bytes)")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Logged conversation payload: {json.dumps(row_data)}")
+            return row_data
+            
+        except Exception as e:
+            self.logger.error(f"Error logging conversation: {str(e)}")
+            return None
+
+    def get_recent_conversations(self, limit: int = 5) -> list:
+        """Get recent conversations from CSV"""
+        try:
+            if os.path.exists(self.csv_path):
+                df = pd.read_csv(self.csv_path, encoding='utf-8')
+                if df.empty:
+                    self.logger.info("No conversations found in CSV")
+                    return []
+                conversations = df.tail(limit).to_dict('records')
+                self.logger.info(f"Retrieved {len(conversations)} recent conversations")
+                return conversations
+        except Exception as e:
+            self.logger.error(f"Error reading conversations: {str(e)}")
+        return []
+
+    def clear_logs(self):
+        """Clear both CSV and log file"""
+        try:
+            # Clear log file
+            with open(self.log_path, 'w', encoding='utf-8') as f:
+                f.write('')
+            
+            # Reinitialize CSV
+            with self._csv_lock:
+                self._write_csv_headers()
+            
+            self.logger.info("Logs cleared successfully")
+        except Exception as e:
+            self.logger.error(f"Error clearing logs: {str(e)}")
+
+# Create singleton instance
 enhanced_logger = EnhancedLogger()
\ No newline at end of file
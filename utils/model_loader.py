@@ -0,0 +1,179 @@
+# model_loader.py
+"""
+Loading of local Hugging Face models with memory-mapped safetensors weights.
+
+When a model directory has safetensors weights, its parameters are assigned
+directly from the memory-mapped files instead of being copied into fresh
+process memory. Processes loading the same model then share its weights
+through the page cache, and cold loads only touch the pages they use.
+
+Usage:
+    python -m utils.model_loader convert <model_dir> [--remove-bin]
+    python -m utils.model_loader report
+"""
+import argparse
+import glob
+import inspect
+import os
+import threading
+from typing import Dict, List
+from config.config import MMAP_MODEL_WEIGHTS
+
+# name -> details of every model loaded through load_pretrained, for memory_report()
+_loaded: Dict[str, Dict] = {}
+_loaded_lock = threading.Lock()
+
+def safetensors_files(path: str) -> List[str]:
+    """The safetensors weight files of a model directory (single file or shards)"""
+    return sorted(glob.glob(os.path.join(path, '*.safetensors')))
+
+def _supports_assign() -> bool:
+    import torch
+    # load_state_dict(assign=True) arrived in torch 2.1
+    return 'assign' in inspect.signature(torch.nn.Module.load_state_dict).parameters
+
+def _load_mapped(model_cls, path: str, files: List[str]):
+    """Build the model without initializing weights and point its parameters at the mapped files"""
+    import torch
+    from safetensors.torch import load_file
+    from transformers import AutoConfig
+    from transformers.modeling_utils import no_init_weights
+
+    config = AutoConfig.from_pretrained(path)
+    build = getattr(model_cls, 'from_config', None) or model_cls._from_config
+    with no_init_weights():
+        model = build(config)
+
+    # Tensors returned by safetensors are backed by a private mmap of the file
+    state_dict = {}
+    for file in files:
+        state_dict.update(load_file(file))
+    if any(tensor.dtype != torch.float32 for tensor in state_dict.values() if tensor.is_floating_point()):
+        # from_pretrained upcasts to float32 on CPU; keeping half precision would change results
+        return None
+
+    missing, _ = model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+
+    # Keys missing from the checkpoint are fine only if they are tied to a loaded tensor
+    loaded_pointers = {tensor.data_ptr() for tensor in state_dict.values()}
+    current = model.state_dict()
+    if any(current[key].data_ptr() not in loaded_pointers for key in missing):
+        return None
+
+    # save_pretrained moves generation settings out of config.json, so read them back like from_pretrained does
+    if model.can_generate() and os.path.exists(os.path.join(path, 'generation_config.json')):
+        from transformers import GenerationConfig
+        model.generation_config = GenerationConfig.from_pretrained(path)
+    return model.eval()
+
+def load_pretrained(model_cls, path: str, name: str = None, **kwargs):
+    """
+    Load model_cls from path, preferring memory-mapped safetensors weights.
+
+    Falls back to a regular from_pretrained when the directory has no safetensors
+    files, the checkpoint needs conversion, or extra from_pretrained kwargs are given.
+    """
+    files = safetensors_files(path)
+    model = None
+    if MMAP_MODEL_WEIGHTS and files and not kwargs and _supports_assign():
+        model = _load_mapped(model_cls, path, files)
+
+    mapped = model is not None
+    if model is None:
+        if files:
+            kwargs.setdefault('use_safetensors', True)
+            kwargs.setdefault('low_cpu_mem_usage', True)
+        model = model_cls.from_pretrained(path, **kwargs)
+
+    with _loaded_lock:
+        _loaded[name or path] = {
+            'path': path,
+            'files': files if mapped else [],
+            'mapped': mapped,
+            'parameter_bytes': sum(p.numel() * p.element_size() for p in model.parameters())
+        }
+    return model
+
+def _mapping_rss(files: List[str]) -> Dict[str, int]:
+    """Resident and mapped bytes of the mappings of files in this process, from /proc/self/smaps"""
+    totals = {'mapped_bytes': 0, 'resident_bytes': 0}
+    targets = {os.path.realpath(file) for file in files}
+    try:
+        with open('/proc/self/smaps') as f:
+            in_target = False
+            for line in f:
+                fields = line.split()
+                if '-' in fields[0] and not fields[0].endswith(':'):
+                    # Mapping header: "start-end perms offset dev inode [path]"
+                    in_target = len(fields) >= 6 and fields[5] in targets
+                elif in_target and fields[0] == 'Size:':
+                    totals['mapped_bytes'] += int(fields[1]) * 1024
+                elif in_target and fields[0] == 'Rss:':
+                    totals['resident_bytes'] += int(fields[1]) * 1024
+    except OSError:
+        # No /proc (e.g. macOS): report mapped sizes only
+        totals['mapped_bytes'] = sum(os.path.getsize(file) for file in files)
+    return totals
+
+def memory_report() -> Dict[str, Dict]:
+    """Per loaded model: whether it is mapped, its weight bytes, and how much of it is resident"""
+    report = {}
+    with _loaded_lock:
+        loaded = dict(_loaded)
+    for name, details in loaded.items():
+        if details['mapped']:
+            memory = _mapping_rss(details['files'])
+        else:
+            # Copied weights live in anonymous memory, so all of them count as resident
+            memory = {'mapped_bytes': 0, 'resident_bytes': details['parameter_bytes']}
+        report[name] = {
+            'mapped': details['mapped'],
+            'parameter_bytes': details['parameter_bytes'],
+            **memory
+        }
+    return report
+
+def convert_to_safetensors(path: str, remove_bin: bool = False) -> List[str]:
+    """Rewrite a PyTorch checkpoint directory with safetensors weights"""
+    import transformers
+    from transformers import AutoConfig
+
+    config = AutoConfig.from_pretrained(path)
+    model_cls = getattr(transformers, config.architectures[0])
+    model = model_cls.from_pretrained(path, use_safetensors=False)
+    model.save_pretrained(path, safe_serialization=True)
+
+    if remove_bin:
+        for file in glob.glob(os.path.join(path, 'pytorch_model*.bin*')):
+            os.remove(file)
+    return safetensors_files(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert local models to safetensors and report their memory use")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert = subparsers.add_parser('convert', help="Write safetensors weights for a model directory")
+    convert.add_argument('path')
+    convert.add_argument('--remove-bin', action='store_true', help="Delete the pytorch_model*.bin files afterwards")
+    subparsers.add_parser('report', help="Load the configured models and report resident vs mapped memory")
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        for file in convert_to_safetensors(args.path, remove_bin=args.remove_bin):
+            print(f"Wrote {file}")
+        return
+
+    from tools.sentiment_tool import load_sentiment_pipeline
+    from tools.multimodal_tool import load_translator, load_image_classifier
+    for loader in [load_sentiment_pipeline, load_translator, load_image_classifier]:
+        try:
+            loader()
+        except Exception as e:
+            print(f"Could not load {loader.__name__}: {str(e)}")
+
+    for name, memory in memory_report().items():
+        print(f"{name}: mapped={memory['mapped']} weights={memory['parameter_bytes'] / 2**20:.1f} MiB "
+              f"file-mapped={memory['mapped_bytes'] / 2**20:.1f} MiB resident={memory['resident_bytes'] / 2**20:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# speculation.py
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, List, Optional
+from utils.logger import enhanced_logger
+from config.config import SPECULATIVE_MAX_WORKERS
+
+@dataclass
+class SpeculativeTask:
+    """A piece of preparatory work started before the LLM has picked a tool"""
+    tool_name: str
+    description: str
+    run: Callable[[str], Any]
+    # (file_path, result of run) -> undo the work of this run only
+    discard: Optional[Callable[[str, Any], None]] = None
+
+@dataclass
+class _RunningTask:
+    task: SpeculativeTask
+    future: Optional[Future] = None
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+class Speculation:
+    """The speculative tasks started for a single query"""
+
+    def __init__(self, executor: 'SpeculativeExecutor', file_path: str, running: List[_RunningTask]):
+        self.executor = executor
+        self.file_path = file_path
+        self.running = running
+        self.adopted = set()
+
+    def adopt(self, tool_name: str):
+        """Wait for the work already running for tool_name so the tool call reuses it"""
+        for item in self.running:
+            if item.task.tool_name != tool_name or id(item) in self.adopted:
+                continue
+            self.adopted.add(id(item))
+            if item.future.cancel():
+                # Still queued behind other sessions' work: the tool call does it itself rather than wait
+                self.executor._record('cancelled')
+                continue
+            try:
+                item.future.result()
+                self.executor._record('hits')
+            except Exception as e:
+                self.executor._record('failures')
+                self.executor.logger.warning(f"Speculative {item.task.description} failed: {str(e)}")
+
+    def finish(self):
+        """Cancel or discard every task the LLM did not end up needing"""
+        if not self.running:
+            return
+        discarded = 0
+        for item in self.running:
+            if id(item) in self.adopted:
+                continue
+            discarded += 1
+            if item.future.cancel():
+                self.executor._record('cancelled')
+                continue
+            self.executor._record('misses')
+            item.future.add_done_callback(lambda future, item=item: self._discard(item, future))
+
+        stats = self.executor.stats()
+        self.executor.logger.info(
+            f"Speculation for {self.file_path}: {len(self.adopted)} adopted, {discarded} cancelled or discarded; "
+            f"overall hit rate {stats['hit_rate']:.0%}, {stats['wasted_seconds']:.1f}s of work wasted"
+        )
+
+    def _discard(self, item: _RunningTask, future: Future):
+        wasted = (item.finished_at or time.perf_counter()) - item.started_at
+        self.executor._record('wasted_seconds', wasted)
+        if future.exception() is None and item.task.discard:
+            try:
+                item.task.discard(self.file_path, future.result())
+            except Exception as e:
+                self.executor.logger.warning(f"Error discarding speculative {item.task.description}: {str(e)}")
+
+class SpeculativeExecutor:
+    """
+    Starts likely tool work for an attached file while the tool-selection call is in flight.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='speculative')
+        self.plans: Dict[str, List[SpeculativeTask]] = {}
+        self.logger = enhanced_logger.logger
+        self._lock = threading.Lock()
+        self._stats = {
+            'started': 0,
+            'hits': 0,
+            'misses': 0,
+            'cancelled': 0,
+            'failures': 0,
+            'wasted_seconds': 0.0
+        }
+
+    def register(self, content_category: str, task: SpeculativeTask):
+        """Register a task for a content category such as 'image' or 'application'"""
+        self.plans.setdefault(content_category, []).append(task)
+
+    def _tasks_for(self, content_type: str) -> List[SpeculativeTask]:
+        tasks = self.plans.get(content_type, [])
+        return tasks or self.plans.get(content_type.split('/')[0], [])
+
+    def start(self, file_path: str, content_type: str, tool_names: Optional[Collection[str]] = None) -> Speculation:
+        """Submit the tasks registered for the content type of file_path, optionally only those of tool_names"""
+        running = []
+        for task in self._tasks_for(content_type):
+            if tool_names is not None and task.tool_name not in tool_names:
+                continue
+            item = _RunningTask(task=task)
+            item.future = self.pool.submit(self._run, item, file_path)
+            running.append(item)
+            self._record('started')
+        return Speculation(self, file_path, running)
+
+    def _run(self, item: _RunningTask, file_path: str):
+        item.started_at = time.perf_counter()
+        try:
+            return item.task.run(file_path)
+        finally:
+            item.finished_at = time.perf_counter()
+
+    def _record(self, key: str, amount: float = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self) -> Dict[str, float]:
+        """Return counters plus the hit rate over all resolved tasks"""
+        with self._lock:
+            stats = dict(self._stats)
+        resolved = stats['hits'] + stats['misses'] + stats['cancelled']
+        stats['hit_rate'] = stats['hits'] / resolved if resolved else 0.0
+        return stats
+
+# Create singleton instance
+speculative_executor = SpeculativeExecutor(max_workers=SPECULATIVE_MAX_WORKERS)
@@ -0,0 +1,256 @@
+# usage.py
+"""
+Token and cost accounting for every LLM call, with per-session and per-day budgets.
+
+Each call is appended to logs/usage.csv, which holds a single day and is moved to
+logs/archive/usage_*.csv.gz when the day changes. The current session and conversation
+are carried in a context variable, so calls made deep inside tools (e.g. Gemini)
+are attributed to the query that triggered them.
+
+Usage:
+    python -m utils.usage [--since 2025-01-01]
+"""
+import argparse
+import csv
+import glob
+import io
+import os
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from utils.logger import enhanced_logger, gzip_file
+from config.config import (
+    SESSION_TOKEN_BUDGET,
+    DAILY_TOKEN_BUDGET,
+    BUDGET_COMPACT_RATIO,
+    TOKEN_PRICES_PER_MILLION,
+    CACHED_PROMPT_PRICE_RATIO,
+    USAGE_MAX_SESSIONS
+)
+
+USAGE_HEADERS = [
+    'timestamp',
+    'session_id',
+    'conversation_id',
+    'stage',
+    'model',
+    'prompt_tokens',
+    'completion_tokens',
+    'cached_tokens',
+    'cost_usd'
+]
+
+# Budget states returned by UsageTracker.budget_state
+BUDGET_OK = "ok"
+BUDGET_COMPACT = "compact"
+BUDGET_EXCEEDED = "exceeded"
+
+# (session_id, conversation_id) of the query being processed
+usage_scope: ContextVar[Optional[Tuple[str, str]]] = ContextVar('usage_scope', default=None)
+
+class UsageTracker:
+    def __init__(self, usage_path: str, archive_dir: str = enhanced_logger.archive_dir):
+        self.usage_path = usage_path
+        self.archive_dir = archive_dir
+        self.logger = enhanced_logger.logger
+        self._lock = threading.Lock()
+        # Tokens per session, least recently active first; idle sessions beyond USAGE_MAX_SESSIONS are forgotten
+        self._sessions: OrderedDict = OrderedDict()
+        self._conversations: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._cache_stats: Dict[str, Dict[str, int]] = {}
+        self._day = datetime.now().date().isoformat()
+        if self._logged_day() not in (None, self._day):
+            self._archive(self._rotate())
+        self._day_tokens = self._load_day_tokens(self._day)
+
+    def _logged_day(self) -> Optional[str]:
+        """Day of the first call in the usage log, or None when it has none"""
+        try:
+            with open(self.usage_path, newline='', encoding='utf-8') as f:
+                row = next(csv.DictReader(f), None)
+        except FileNotFoundError:
+            return None
+        return row['timestamp'][:10] if row else None
+
+    def _load_day_tokens(self, day: str) -> int:
+        """Sum today's tokens from the usage log so the daily budget survives restarts"""
+        total = 0
+        if not os.path.exists(self.usage_path):
+            return total
+        try:
+            with open(self.usage_path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    if row['timestamp'].startswith(day):
+                        total += int(row['prompt_tokens'] or 0) + int(row['completion_tokens'] or 0)
+        except Exception as e:
+            self.logger.error(f"Error reading usage log: {str(e)}")
+        return total
+
+    def _rotate(self) -> Optional[str]:
+        """Move the usage log of the previous day aside; returns the moved file"""
+        if not os.path.exists(self.usage_path):
+            return None
+        os.makedirs(self.archive_dir, exist_ok=True)
+        segment = os.path.join(self.archive_dir, f"usage_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.csv")
+        os.replace(self.usage_path, segment)
+        return segment
+
+    def _archive(self, segment: Optional[str]):
+        if segment:
+            try:
+                gzip_file(segment, segment + '.gz')
+                self.logger.info(f"Rotated usage log to {segment}.gz")
+            except Exception as e:
+                self.logger.error(f"Error archiving usage log: {str(e)}")
+
+    def _start_day(self, today: str) -> Optional[str]:
+        """Reset the daily total when the day changes (caller holds the lock); returns the usage log to archive"""
+        if today == self._day:
+            return None
+        self._day, self._day_tokens = today, 0
+        return self._rotate()
+
+    def _cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+        # Responses name dated snapshots (gpt-4o-2024-08-06), so match the longest configured prefix
+        prefixes = [prefix for prefix in TOKEN_PRICES_PER_MILLION if model.startswith(prefix)]
+        prompt_price, completion_price = TOKEN_PRICES_PER_MILLION[max(prefixes, key=len)] if prefixes else (0.0, 0.0)
+        prompt_cost = (prompt_tokens - cached_tokens) * prompt_price + cached_tokens * prompt_price * CACHED_PROMPT_PRICE_RATIO
+        return (prompt_cost + completion_tokens * completion_price) / 1_000_000
+
+    def record(self, stage: str, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Dict:
+        """Record one LLM call against the current session, conversation and day"""
+        scope = usage_scope.get()
+        session_id, conversation_id = scope or (None, None)
+        total = prompt_tokens + completion_tokens
+        row = {
+            'timestamp': datetime.now().isoformat(),
+            'session_id': session_id,
+            'conversation_id': conversation_id,
+            'stage': stage,
+            'model': model,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'cached_tokens': cached_tokens,
+            'cost_usd': round(self._cost(model, prompt_tokens, completion_tokens, cached_tokens), 6)
+        }
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=USAGE_HEADERS)
+        with self._lock:
+            segment = self._start_day(row['timestamp'][:10])
+            self._day_tokens += total
+            if session_id:
+                self._sessions[session_id] = self._sessions.get(session_id, 0) + total
+                self._sessions.move_to_end(session_id)
+                while len(self._sessions) > USAGE_MAX_SESSIONS:
+                    self._sessions.popitem(last=False)
+            stats = self._cache_stats.setdefault(stage, {'calls': 0, 'calls_with_hits': 0, 'prompt_tokens': 0, 'cached_tokens': 0})
+            stats['calls'] += 1
+            stats['calls_with_hits'] += cached_tokens > 0
+            stats['prompt_tokens'] += prompt_tokens
+            stats['cached_tokens'] += cached_tokens
+            if scope:
+                totals = self._conversations.setdefault(scope, {'prompt_tokens': 0, 'completion_tokens': 0})
+                totals['prompt_tokens'] += prompt_tokens
+                totals['completion_tokens'] += completion_tokens
+
+            try:
+                if not os.path.exists(self.usage_path):
+                    writer.writeheader()
+                writer.writerow(row)
+                with open(self.usage_path, 'a', newline='', encoding='utf-8') as f:
+                    f.write(buffer.getvalue())
+            except Exception as e:
+                self.logger.error(f"Error logging usage: {str(e)}")
+        # Compress outside the lock so other calls can keep recording meanwhile
+        self._archive(segment)
+        return row
+
+    def record_openai(self, stage: str, response: Any) -> Optional[Dict]:
+        """Record the usage block of an OpenAI chat completion"""
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return None
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = getattr(details, 'cached_tokens', 0) or 0
+        return self.record(stage, response.model, usage.prompt_tokens, usage.completion_tokens, cached)
+
+    def record_gemini(self, stage: str, model_id: str, response: Any) -> Optional[Dict]:
+        """Record the usage metadata of a Gemini generate_content response"""
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is None:
+            return None
+        cached = getattr(usage, 'cached_content_token_count', 0) or 0
+        return self.record(stage, model_id, usage.prompt_token_count or 0, usage.candidates_token_count or 0, cached)
+
+    def pop_conversation_tokens(self, scope: Tuple[str, str]) -> Dict[str, int]:
+        """Prompt and completion tokens used by a finished (session_id, conversation_id), forgetting them afterwards"""
+        with self._lock:
+            return dict(self._conversations.pop(scope, {'prompt_tokens': 0, 'completion_tokens': 0}))
+
+    def prefix_cache_stats(self) -> Dict[str, Dict]:
+        """Per stage since startup: calls, how many hit the provider's prefix cache, and the cached share of prompt tokens"""
+        with self._lock:
+            stats = {stage: dict(values) for stage, values in self._cache_stats.items()}
+        for values in stats.values():
+            values['hit_rate'] = round(values['cached_tokens'] / values['prompt_tokens'], 4) if values['prompt_tokens'] else 0.0
+        return stats
+
+    def budget_state(self, session_id: str, pending_tokens: int = 0) -> str:
+        """Whether the session can proceed normally, should compact its prompts, or is out of budget, counting pending_tokens about to be spent"""
+        with self._lock:
+            segment = self._start_day(datetime.now().date().isoformat())
+            ratios = [(self._day_tokens + pending_tokens) / DAILY_TOKEN_BUDGET if DAILY_TOKEN_BUDGET else 0.0]
+            if SESSION_TOKEN_BUDGET:
+                ratios.append((self._sessions.get(session_id, 0) + pending_tokens) / SESSION_TOKEN_BUDGET)
+        self._archive(segment)
+        used = max(ratios)
+        if used >= 1.0:
+            return BUDGET_EXCEEDED
+        if used >= BUDGET_COMPACT_RATIO:
+            return BUDGET_COMPACT
+        return BUDGET_OK
+
+# Create singleton instance
+usage_tracker = UsageTracker(os.path.join(enhanced_logger.log_dir, 'usage.csv'))
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Token and cost report per stage and model")
+    parser.add_argument('--since', help="First day to include (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(usage_tracker.archive_dir, 'usage_*.csv.gz')))
+    if os.path.exists(usage_tracker.usage_path):
+        paths.append(usage_tracker.usage_path)
+    if not paths:
+        print("No usage recorded yet")
+        return
+    df = pd.concat([pd.read_csv(path, parse_dates=['timestamp']) for path in paths], ignore_index=True)
+    if args.since:
+        df = df[df['timestamp'] >= pd.Timestamp(args.since)]
+    df['total_tokens'] = df['prompt_tokens'] + df['completion_tokens']
+
+    by_stage = df.groupby(['stage', 'model']).agg(
+        calls=('total_tokens', 'size'),
+        prompt_tokens=('prompt_tokens', 'sum'),
+        completion_tokens=('completion_tokens', 'sum'),
+        cached_tokens=('cached_tokens', 'sum'),
+        calls_with_cache_hits=('cached_tokens', lambda v: int((v > 0).sum())),
+        mean_prompt_tokens=('prompt_tokens', 'mean'),
+        p95_prompt_tokens=('prompt_tokens', lambda v: v.quantile(0.95)),
+        cost_usd=('cost_usd', 'sum')
+    ).sort_values('prompt_tokens', ascending=False)
+    by_stage['share_of_tokens'] = (by_stage['prompt_tokens'] + by_stage['completion_tokens']) / df['total_tokens'].sum()
+    # Share of prompt tokens served from the provider's prefix cache
+    by_stage['cache_hit_rate'] = (by_stage['cached_tokens'] / by_stage['prompt_tokens']).fillna(0.0)
+
+    print("== Tokens by stage (most expensive first) ==")
+    print(by_stage.to_string())
+    print(f"\nTotal: {int(df['total_tokens'].sum())} tokens, ${df['cost_usd'].sum():.4f}")
+
+if __name__ == "__main__":
+    main()